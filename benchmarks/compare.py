@@ -0,0 +1,37 @@
+'''Compare two results of benchmarks/stages.py, listing the stages that got slower
+
+Stages are matched by ligand, number of initial conformers and stage, and compared by their time
+per conformer. Exits with status 1 if any stage is slower than the baseline by more than the
+tolerance (a ratio, 1.25 by default), so it can gate a release.
+
+    python benchmarks/compare.py baseline.json results.json [tolerance]
+'''
+import json
+import sys
+
+
+def stage_times(path):
+    results = json.loads(open(path).read())
+    return {(record['ligand'], record['initial_conformers'], record['stage']): record['seconds_per_item']
+            for record in results['records'] if record['seconds_per_item'] is not None}
+
+
+def main(baseline_path, results_path, tolerance=1.25):
+    baseline = stage_times(baseline_path)
+    results = stage_times(results_path)
+    regressions = 0
+    for key in sorted(baseline.keys() & results.keys()):
+        ratio = results[key] / baseline[key] if baseline[key] > 0 else float('inf')
+        regressed = ratio > tolerance
+        regressions += regressed
+        ligand, initial_conformers, stage = key
+        print(f'{ligand:<20}{initial_conformers:>5}  {stage:<20}{baseline[key]:10.4f} s -> {results[key]:10.4f} s '
+              f'({ratio:5.2f}x){"  REGRESSION" if regressed else ""}')
+    for key in sorted(baseline.keys() ^ results.keys()):
+        print(f'{" ".join(map(str, key))} is only in {baseline_path if key in baseline else results_path}')
+    print(f'{regressions} stages slower than {tolerance}x the baseline')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1], sys.argv[2], *(float(arg) for arg in sys.argv[3:])))
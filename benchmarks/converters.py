@@ -0,0 +1,62 @@
+'''Time the direct molecule converters of utils against the mol and xyz block conversions they replace
+
+    python benchmarks/converters.py [repeats]
+'''
+import sys
+import timeit
+
+import ase
+import stk
+from openbabel import pybel as pb
+from rdkit.Chem import rdmolops
+from rdkit.Chem.rdmolfiles import MolFromMolBlock, MolToMolBlock, MolToXYZBlock
+
+from conformational_sampling.main import bind_to_dimethyl_Pd
+from conformational_sampling.utils import (
+    pybel_mol_to_stk_mol,
+    stk_mol_to_ase_atoms,
+    stk_mol_to_pybel_mol,
+)
+
+
+def text_stk_mol_to_pybel_mol(stk_mol, reperceive_bonds=False):
+    if reperceive_bonds:
+        return pb.readstring('xyz', MolToXYZBlock(stk_mol.to_rdkit_mol()))
+    return pb.readstring('mol', MolToMolBlock(stk_mol.to_rdkit_mol()))
+
+
+def text_pybel_mol_to_stk_mol(pybel_mol):
+    rdkit_mol = MolFromMolBlock(pybel_mol.write('mol'), removeHs=False)
+    rdmolops.Kekulize(rdkit_mol)
+    return stk.BuildingBlock.init_from_rdkit_mol(rdkit_mol)
+
+
+def listed_stk_mol_to_ase_atoms(stk_mol):
+    return ase.Atoms(
+        positions=list(stk_mol.get_atomic_positions()),
+        numbers=[atom.get_atomic_number() for atom in stk_mol.get_atoms()]
+    )
+
+
+def main(repeats=200):
+    functional_group = stk.SmartsFunctionalGroupFactory(smarts='P', bonders=(0,), deleters=())
+    ligand = stk.BuildingBlock('c1ccc(cc1)P(c1ccccc1)c1ccccc1', [functional_group])
+    stk_mol = bind_to_dimethyl_Pd(ligand)
+    pybel_mol = stk_mol_to_pybel_mol(stk_mol)
+    print(f'{stk_mol.get_num_atoms()} atoms, {repeats} conversions each')
+    cases = {
+        'stk -> openbabel': (lambda: text_stk_mol_to_pybel_mol(stk_mol), lambda: stk_mol_to_pybel_mol(stk_mol)),
+        'stk -> openbabel, reperceive bonds': (lambda: text_stk_mol_to_pybel_mol(stk_mol, True),
+                                               lambda: stk_mol_to_pybel_mol(stk_mol, True)),
+        'openbabel -> stk': (lambda: text_pybel_mol_to_stk_mol(pybel_mol), lambda: pybel_mol_to_stk_mol(pybel_mol)),
+        'stk -> ase': (lambda: listed_stk_mol_to_ase_atoms(stk_mol), lambda: stk_mol_to_ase_atoms(stk_mol)),
+    }
+    for name, (text, direct) in cases.items():
+        text_time = timeit.timeit(text, number=repeats) / repeats
+        direct_time = timeit.timeit(direct, number=repeats) / repeats
+        print(f'{name:<36}{text_time * 1e6:9.1f} us -> {direct_time * 1e6:9.1f} us '
+              f'({text_time / direct_time:4.1f}x)')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,78 @@
+'''Gradient calls of the DFT stage with and without an xTB initial Hessian
+
+GFN1-xTB stands in for the DFT calculator, optimizing GFN2-xTB optimized conformers of a
+phosphine bound to dimethyl palladium, the same way dft_optimize continues from the xTB stage.
+
+    python benchmarks/dft_warm_start.py [num_conformers] [fmax]
+'''
+import sys
+import time
+
+import numpy as np
+import stk
+from xtb.ase.calculator import XTB
+
+from conformational_sampling.accounting import CountingCalculator
+from conformational_sampling.calculators import xtb_calculator
+from conformational_sampling.config import Config
+from conformational_sampling.main import XTB_PARAMETERS, bind_to_dimethyl_Pd, gen_confs_openbabel, xtb_optimize
+from conformational_sampling.optimizers import (
+    HESSIAN_OPTIMIZERS,
+    finite_difference_hessian,
+    make_optimizer,
+    positive_definite,
+)
+from conformational_sampling.utils import stk_mol_to_ase_atoms
+
+
+def xtb_conformers(num_conformers):
+    ligand = stk.BuildingBlock('CPCC')
+    functional_group = stk.SmartsFunctionalGroupFactory(smarts='P', bonders=(0,), deleters=())
+    ligand = stk.BuildingBlock.init_from_molecule(ligand, functional_groups=[functional_group])
+    ligand_conformers = gen_confs_openbabel(ligand, Config(initial_conformers=num_conformers))
+    results = [xtb_optimize(bind_to_dimethyl_Pd(conformer)) for conformer in ligand_conformers]
+    return [result.stk_mol for result in results if result is not None]
+
+
+def gradient_calls(stk_mol, optimizer, warm_start, fmax):
+    atoms = stk_mol_to_ase_atoms(stk_mol)
+    hessian = None
+    if warm_start:
+        hessian = positive_definite(
+            finite_difference_hessian(atoms, xtb_calculator(XTB_PARAMETERS['method'])))
+    calculator = CountingCalculator(XTB(method='GFN1-xTB'))
+    atoms.calc = calculator
+    opt = make_optimizer(optimizer, atoms, hessian=hessian, logfile=None)
+    converged = opt.run(fmax=fmax, steps=500)
+    return len(calculator.calls), converged
+
+
+def main(num_conformers=4, fmax=0.05):
+    conformers = xtb_conformers(num_conformers)
+    num_atoms = conformers[0].get_num_atoms()
+    print(f'{len(conformers)} conformers of {num_atoms} atoms, fmax {fmax}, '
+          f'{6 * num_atoms} xTB gradients per xTB Hessian')
+    cold_start_calls = {}
+    for optimizer in ('BFGS', 'BFGSLineSearch', 'FIRE', 'PreconLBFGS'):
+        for warm_start in (False, True):
+            if warm_start and optimizer not in HESSIAN_OPTIMIZERS:
+                continue
+            start = time.perf_counter()
+            try:
+                runs = [gradient_calls(conformer, optimizer, warm_start, fmax) for conformer in conformers]
+            except Exception as exception:
+                print(f'{optimizer:<15}{"xtb hessian" if warm_start else "":<12} failed: {exception!r}')
+                continue
+            calls = np.array([calls for calls, converged in runs])
+            print(f'{optimizer:<15}{"xtb hessian" if warm_start else "":<12}'
+                  f'gradient calls per conformer {calls.mean():6.1f} (min {calls.min()}, max {calls.max()}), '
+                  f'{sum(converged for calls, converged in runs)}/{len(runs)} converged, '
+                  f'{time.perf_counter() - start:.1f} s')
+            if warm_start:
+                print(f'{"":<27}gradient calls saved per conformer {cold_start_calls[optimizer] - calls.mean():6.1f}')
+            else:
+                cold_start_calls[optimizer] = calls.mean()
+
+
+if __name__ == '__main__':
+    main(*(type_(arg) for type_, arg in zip((int, float), sys.argv[1:])))
@@ -0,0 +1,147 @@
+'''Time each stage of the conformer funnel on synthetic complexes of increasing size
+
+Each ligand of LIGANDS is bound to dimethyl palladium and taken through the conformer search,
+binding, MCHammer, MetalOptimizer, uniqueness filtering, local optimization, output writing and
+the pyGSM setup, for each number of initial conformers. ASE's EMT calculator stands in for xTB
+and DFT when it has parameters for every element of the complex, and a Lennard-Jones calculator
+otherwise, so the timings are of the funnel itself rather than of the electronic structure. The
+pyGSM setup is only timed if pyGSM is installed.
+
+The results are written as JSON, one record per ligand, ensemble size and stage, for tracking
+scaling curves between versions with benchmarks/compare.py.
+
+    python benchmarks/stages.py [output.json] [initial_conformers ...]
+'''
+import json
+import platform
+import sys
+import tempfile
+import time
+from importlib.metadata import version
+from pathlib import Path
+
+import numpy as np
+import stk
+import stko
+from ase.calculators.emt import EMT
+from ase.calculators.emt import parameters as emt_parameters
+from ase.calculators.lj import LennardJones
+
+from conformational_sampling.ase_stko_optimizer import ASE
+from conformational_sampling.config import Config
+from conformational_sampling.main import NAMES, bind_to_dimethyl_Pd, gen_confs_openbabel
+from conformational_sampling.output import ConformerWriter
+from conformational_sampling.rmsd import UniqueConformerFilter
+from conformational_sampling.utils import stk_mol_symbols
+
+try:
+    from conformational_sampling.gsm import gsm_reactant
+except ImportError:
+    gsm_reactant = None
+
+# name, SMILES and donor atom SMARTS of the ligands, in order of increasing size
+LIGANDS = (
+    ('trimethylamine', 'CN(C)C', '[#7]'),
+    ('tmeda', 'CN(C)CCN(C)C', '[#7]'),
+    ('triphenylphosphine', 'c1ccc(cc1)P(c1ccccc1)c1ccccc1', '[#15]'),
+    ('tributylamine', 'CCCCN(CCCC)CCCC', '[#7]'),
+    ('trioctylamine', 'CCCCCCCCN(CCCCCCCC)CCCCCCCC', '[#7]'),
+)
+INITIAL_CONFORMERS = (4, 16)
+# loose, since the stand-in calculators only need to take the optimizer through a few steps
+FMAX = 0.5
+UNIQUE_RMS_THRESHOLD = Config.pre_xtb_rms_threshold
+
+
+def stand_in_calculator(stk_mol):
+    'EMT if it has parameters for all the elements of the molecule, else Lennard-Jones'
+    if set(stk_mol_symbols(stk_mol)) <= set(emt_parameters):
+        return 'EMT', EMT()
+    # sigma so the minimum is near a typical bond length, cut off before the next neighbours
+    return 'LennardJones', LennardJones(sigma=1.3, epsilon=0.1, rc=3.0)
+
+
+def timed(records, record, stage, function, items):
+    'run function on each of the items, adding a record of the time taken, and return the results'
+    start = time.perf_counter()
+    results = [function(item) for item in items]
+    seconds = time.perf_counter() - start
+    records.append({**record, 'stage': stage, 'items': len(items), 'seconds': seconds,
+                    'seconds_per_item': seconds / len(items) if items else None})
+    return results
+
+
+def write_output(stk_mols):
+    'write the conformers to one xyz file per stage as the pipeline does, and compact the files'
+    symbols = stk_mol_symbols(stk_mols[0])
+    positions = np.array([stk_mol.get_position_matrix() for stk_mol in stk_mols])
+    with tempfile.TemporaryDirectory() as directory:
+        writer = ConformerWriter({stage: Path(directory, f'conformers_{stage}_{name}.xyz')
+                                  for stage, name in NAMES.items()}, symbols)
+        for stage in NAMES:
+            for conformer_positions in positions:
+                writer.append(stage, conformer_positions, 0.0)
+            writer.compact(stage, positions, [0.0] * len(positions))
+        writer.close()
+
+
+def benchmark_ligand(name, smiles, smarts, initial_conformers):
+    functional_group = stk.SmartsFunctionalGroupFactory(smarts=smarts, bonders=(0,), deleters=())
+    ligand = stk.BuildingBlock(smiles, functional_groups=[functional_group])
+    complex = bind_to_dimethyl_Pd(ligand)
+    calculator_name, calculator = stand_in_calculator(complex)
+    record = {'ligand': name, 'num_atoms': complex.get_num_atoms(),
+              'initial_conformers': initial_conformers, 'calculator': calculator_name}
+    records = []
+
+    conformers, = timed(records, record, 'conformer_search', lambda config: gen_confs_openbabel(ligand, config),
+                        [Config(initial_conformers=initial_conformers)])
+    record['num_conformers'] = records[0]['num_conformers'] = len(conformers)
+    complexes = timed(records, record, 'binding', bind_to_dimethyl_Pd, conformers)
+    complexes = timed(records, record, 'mc_hammer', stk.MCHammer().optimize, complexes)
+    complexes = timed(records, record, 'metal_optimizer', stko.MetalOptimizer().optimize, complexes)
+    unique_filter = UniqueConformerFilter(complexes[0], UNIQUE_RMS_THRESHOLD)
+    unique = timed(records, record, 'dedup', unique_filter.add, complexes)
+    complexes = [complex for complex, is_unique in zip(complexes, unique) if is_unique]
+    results = timed(records, record, 'local_optimization', ASE(calculator, fmax=FMAX).optimize_with_energy,
+                    complexes)
+    optimized = [result.stk_mol for result in results if result is not None]
+    timed(records, record, 'output_writing', write_output, [optimized])
+
+    if gsm_reactant is not None:
+        # break both palladium-methyl bonds, as in a reductive elimination
+        metal_bonds = [(bond.get_atom1(), bond.get_atom2()) for bond in complex.get_bonds()
+                       if 46 in (bond.get_atom1().get_atomic_number(), bond.get_atom2().get_atomic_number())]
+        # pyGSM numbers atoms from 1
+        driving_coordinates = [('BREAK', *(atom.get_id() + 1 for atom in bond)) for bond in metal_bonds
+                               if 6 in (atom.get_atomic_number() for atom in bond)]
+        gsm_config = Config(ase_calculator=calculator)
+        timed(records, record, 'gsm_setup',
+              lambda stk_mol: gsm_reactant(stk_mol, driving_coordinates, gsm_config), optimized[:1])
+    return records
+
+
+def main(output_path='benchmark_stages.json', *initial_conformers):
+    initial_conformers = [int(num) for num in initial_conformers] or INITIAL_CONFORMERS
+    records = []
+    for name, smiles, smarts in LIGANDS:
+        for num in initial_conformers:
+            ligand_records = benchmark_ligand(name, smiles, smarts, num)
+            for record in ligand_records:
+                print(f'{record["ligand"]:<20}{record["num_atoms"]:>5} atoms{record["num_conformers"]:>5} conformers '
+                      f'{record["stage"]:<20}{record["seconds"]:9.3f} s')
+            records.extend(ligand_records)
+    results = {
+        'version': version('py-conformational-sampling'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'time': time.time(),
+        'gsm': gsm_reactant is not None,
+        'records': records,
+    }
+    Path(output_path).write_text(json.dumps(results, indent=2))
+    print(f'wrote {len(records)} timings to {output_path}')
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -3,6 +3,8 @@
 #SBATCH -c20
 #SBATCH --time=2-0
 #SBATCH -o output.txt
+# sync the checkpoint 5 minutes before the time limit, rerun the script to resume
+#SBATCH --signal=B:USR1@300
 
 import os
 from pathlib import Path
@@ -33,6 +35,7 @@ config = Config(
     max_dft_opt_steps=2,
     # num_cpus=16,
     dft_cpus_per_opt=4,
+    checkpoint_path=Path('checkpoint.pkl'),
 )
 
 # qchem ase calculator setup
@@ -0,0 +1,47 @@
+#!/export/zimmerman/joshkamm/Lilly/py-conformational-sampling/.venv/bin/python
+#SBATCH -p zimintel --job-name=conformational_sampling_screen
+#SBATCH -c20
+#SBATCH --time=2-0
+#SBATCH -o output.txt
+# sync the checkpoints 5 minutes before the time limit, rerun the script to resume
+#SBATCH --signal=B:USR1@300
+
+import os
+from pathlib import Path
+import logging
+FORMAT = "[%(asctime)s %(threadName)s %(filename)s->%(funcName)s():%(lineno)s]%(levelname)s: %(message)s"
+logging.basicConfig(format=FORMAT, level=logging.DEBUG)
+
+from conformational_sampling.config import Config
+from conformational_sampling.screening import read_manifest, screen
+
+# ligands to screen: geometry files and smarts strings of the atoms that bind to the metal
+entries = read_manifest(Path('manifest.csv'))
+
+# py-conformational-sampling configuration object, shared by all ligands
+config = Config(
+    initial_conformers=100,
+    xtb_path='/export/apps/CentOS7/xtb/xtb/bin/xtb',
+    max_dft_opt_steps=2,
+    dft_cpus_per_opt=4,
+    # each ligand gets its own checkpoint of this name in its output directory
+    checkpoint_path=Path('checkpoint.pkl'),
+    library_path=Path('library.sqlite'),
+)
+
+# qchem ase calculator setup
+from ase.calculators.qchem import QChem
+os.environ['QCSCRATCH'] = os.environ['SLURM_LOCAL_SCRATCH']
+config.ase_calculator = QChem(
+    method='PBE',
+    basis='LANL2DZ',
+    ecp='fit-LANL2DZ',
+    SCF_CONVERGENCE='5',
+    nt=config.dft_cpus_per_opt,
+)
+
+if __name__ == '__main__':
+    # runs several ligands at a time over one pool of workers, writing each to results/<name>
+    failures = screen(entries, config, output_dir=Path('results'), max_concurrent_ligands=4)
+    if failures:
+        logging.error(f'Failed ligands: {list(failures)}')
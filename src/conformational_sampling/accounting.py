@@ -0,0 +1,94 @@
+import hashlib
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import NamedTuple
+
+from ase.calculators.calculator import Calculator, all_changes
+
+# calls of the counting calculators in this context, None when calls are not being collected
+_collected_calls = ContextVar('collected_calls', default=None)
+
+
+class CalculatorCall(NamedTuple):
+    properties: tuple
+    seconds: float
+    # the calculator already computed this exact geometry before
+    repeated: bool
+    # e.g. the GSM node the call was for
+    tag: object = None
+
+
+def geometry_key(atoms) -> bytes:
+    sha = hashlib.sha1(atoms.get_atomic_numbers().tobytes())
+    sha.update(atoms.get_positions().tobytes())
+    sha.update(atoms.get_cell().tobytes())
+    return sha.digest()
+
+
+class CountingCalculator(Calculator):
+    '''ASE calculator passing every calculation on to another one, recording each call
+
+    Calls are only made when the positions or atoms changed since the last one, as for any ASE
+    calculator, so every call is a real energy/gradient evaluation of the wrapped calculator. A
+    call is marked repeated if the same geometry was computed before, such as a geometry an
+    optimizer returned to or one that was computed again after a reset. The calls go to
+    self.calls and to the collection of counted_calls(), tagged with self.tag.
+    '''
+    def __init__(self, calculator: Calculator, tag=None) -> None:
+        super().__init__()
+        self.calculator = calculator
+        self.implemented_properties = calculator.implemented_properties
+        self.tag = tag
+        self.calls = []
+        self.geometries = set()
+
+    def calculate(self, atoms=None, properties=('energy',), system_changes=all_changes) -> None:
+        super().calculate(atoms, properties, system_changes)
+        key = geometry_key(self.atoms)
+        # changes relative to what the wrapped calculator last computed, which may be before this
+        # wrapper was made, so e.g. the per worker xTB calculator keeps its set up state
+        if self.calculator.atoms is not None:
+            system_changes = self.calculator.check_state(self.atoms)
+        start = time.perf_counter()
+        self.calculator.calculate(self.atoms, properties, system_changes)
+        call = CalculatorCall(tuple(properties), time.perf_counter() - start, key in self.geometries, self.tag)
+        self.results = dict(self.calculator.results)
+        self.geometries.add(key)
+        self.calls.append(call)
+        collected = _collected_calls.get()
+        if collected is not None:
+            collected.append(call)
+
+
+def counting_calculator(calculator: Calculator, tag=None) -> Calculator:
+    'the calculator wrapped in a CountingCalculator if calls are being collected, else unchanged'
+    if calculator is None or _collected_calls.get() is None:
+        return calculator
+    return CountingCalculator(calculator, tag)
+
+
+@contextmanager
+def counted_calls():
+    'collect the calls of all counting calculators in the body into the list it gives'
+    calls = []
+    token = _collected_calls.set(calls)
+    try:
+        yield calls
+    finally:
+        _collected_calls.reset(token)
+
+
+def call_totals(calls) -> dict:
+    'number, time and repeated geometries of calculator calls, in total and by tag'
+    def totals(calls):
+        return {
+            'calls': len(calls),
+            'seconds': sum(call.seconds for call in calls),
+            'max_seconds': max((call.seconds for call in calls), default=0.0),
+            'repeated': sum(call.repeated for call in calls),
+        }
+
+    tags = dict.fromkeys(call.tag for call in calls if call.tag is not None)
+    return {**totals(calls), 'by_tag': {str(tag): totals([call for call in calls if call.tag == tag])
+                                        for tag in tags}}
@@ -1,6 +1,9 @@
 from dataclasses import dataclass
+from typing import NamedTuple
 
 import ase
+import numpy as np
+import stk
 import stko
 from ase.calculators.calculator import Calculator, CalculationFailed
 from ase.optimize import BFGS
@@ -8,17 +11,43 @@ from ase.optimize import BFGS
 from conformational_sampling.utils import stk_mol_to_ase_atoms
 
 
+class OptimizationResult(NamedTuple):
+    stk_mol: stk.Molecule
+    energy: float
+    # number of optimizer steps and the largest atomic force at the final geometry
+    steps: int = None
+    fmax: float = None
+
+
+def max_force(forces) -> float:
+    'largest atomic force, the fmax convergence criterion of the ASE optimizers'
+    return float(np.sqrt((forces**2).sum(axis=1).max()))
+
+
 @dataclass
 class ASE(stko.optimizers.Optimizer):
     calculator: Calculator
+    fmax: float = 0.1
 
     def optimize(self, stk_mol):
+        result = self.optimize_with_energy(stk_mol)
+        return None if result is None else result.stk_mol
+
+    def optimize_with_energy(self, stk_mol):
+        'optimize the molecule, also returning the energy and forces computed at the final geometry'
         ase_mol = stk_mol_to_ase_atoms(stk_mol)
         ase_mol.calc = self.calculator
         opt = BFGS(ase_mol)
         try:
-            opt.run(fmax=0.1)
+            opt.run(fmax=self.fmax)
+            # cached results of the last step, whose forces met fmax
+            energy = ase_mol.get_potential_energy()
+            forces = ase_mol.get_forces()
         except CalculationFailed:
             return None
-        stk_mol.with_position_matrix(opt.atoms.get_positions())
-        return stk_mol
\ No newline at end of file
+        return OptimizationResult(
+            stk_mol=stk_mol.with_position_matrix(ase_mol.get_positions()),
+            energy=energy,
+            steps=opt.nsteps,
+            fmax=max_force(forces),
+        )
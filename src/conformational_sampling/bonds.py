@@ -0,0 +1,50 @@
+import numpy as np
+import stk
+from ase.data import covalent_radii
+
+# atoms are bonded if closer than the sum of their covalent radii plus this (Å), as in openbabel
+BOND_TOLERANCE = 0.45
+# closer atoms are treated as overlapping, not bonded
+MIN_BOND_LENGTH = 0.4
+# max number of bonds of elements that have one, beyond which the longest bonds are dropped
+MAX_BONDS = {1: 1, 5: 4, 6: 4, 7: 4, 8: 2, 9: 1, 17: 1, 35: 1, 53: 1}
+
+
+def perceive_bonds(numbers, positions):
+    '''Adjacency matrices of the bonds perceived from the positions of the atoms
+
+    positions may hold any number of conformers of the same atoms, with shape (..., num_atoms, 3),
+    and the adjacency matrices have shape (..., num_atoms, num_atoms). Atoms are bonded if their
+    distance is within the sum of their covalent radii plus BOND_TOLERANCE. Main group atoms keep
+    only their MAX_BONDS closest bonds, so that e.g. the hydrogens and carbons of a ligand close to
+    a metal centre are not bonded to it as well as to their own neighbours.
+    '''
+    numbers = np.asarray(numbers)
+    positions = np.asarray(positions, dtype=float)
+    distances = np.linalg.norm(positions[..., :, None, :] - positions[..., None, :, :], axis=-1)
+    radii = covalent_radii[numbers]
+    cutoffs = radii[:, None] + radii[None, :] + BOND_TOLERANCE
+    adjacency = (distances < cutoffs) & (distances > MIN_BOND_LENGTH)
+
+    for atom in np.flatnonzero(np.isin(numbers, list(MAX_BONDS))):
+        # drop the longest bonds of the atom beyond its max number of bonds
+        atom_distances = np.where(adjacency[..., atom, :], distances[..., atom, :], np.inf)
+        ranks = atom_distances.argsort(axis=-1).argsort(axis=-1)
+        excess = adjacency[..., atom, :] & (ranks >= MAX_BONDS[numbers[atom]])
+        adjacency[..., atom, :] &= ~excess
+        adjacency[..., :, atom] &= ~excess
+    return adjacency
+
+
+def adjacency_matrix(stk_mol: stk.Molecule):
+    'adjacency matrix of the bonds of an stk molecule'
+    adjacency = np.zeros((stk_mol.get_num_atoms(),) * 2, dtype=bool)
+    for bond in stk_mol.get_bonds():
+        i, j = bond.get_atom1().get_id(), bond.get_atom2().get_id()
+        adjacency[i, j] = adjacency[j, i] = True
+    return adjacency
+
+
+def num_connectivity_differences(adjacency_1, adjacency_2):
+    'number of bonds in only one of two adjacency matrices, for any number of leading conformer axes'
+    return np.triu(adjacency_1 ^ adjacency_2, k=1).sum(axis=(-2, -1))
@@ -0,0 +1,137 @@
+import hashlib
+import os
+import random
+import tempfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, NamedTuple
+
+import numpy as np
+import stk
+
+from conformational_sampling.ase_stko_optimizer import OptimizationResult
+
+# positions are rounded to this many decimal places (angstroms) before hashing
+POSITION_DECIMALS = 4
+
+
+class CacheEntry(NamedTuple):
+    positions: np.ndarray = None
+    energy: float = None
+    steps: int = None
+    fmax: float = None
+
+
+class StageCache:
+    '''Content addressed on-disk cache of stage results (optimized geometries and energies)
+
+    Each entry is its own file in a two character shard directory and is written to a temporary
+    file that is atomically renamed into place, so worker processes and SLURM jobs sharing a
+    filesystem can read and write concurrently without locks. Reading an entry updates its
+    modification time, and once the cache grows past max_bytes the least recently used entries
+    are evicted.
+
+    Since entries are keyed by geometry, a rerun only hits the cache if it starts from the same
+    conformers. The OpenBabel conformer search is not deterministic, so this relies on the
+    searches being served from the same cache by ligand_cache.LigandConformerCache.
+    '''
+    def __init__(self, path: Path, max_bytes: int = 10 * 2**30) -> None:
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(stk_mol: stk.Molecule, stage: str, parameters: dict = None) -> str:
+        'hash of the atoms, rounded positions and bonds of a molecule along with the stage settings'
+        sha = hashlib.sha256()
+        sha.update(np.array([atom.get_atomic_number() for atom in stk_mol.get_atoms()]).tobytes())
+        positions = np.round(stk_mol.get_position_matrix() * 10**POSITION_DECIMALS).astype(np.int64)
+        sha.update(positions.tobytes())
+        bonds = sorted((*sorted((bond.get_atom1().get_id(), bond.get_atom2().get_id())), bond.get_order())
+                       for bond in stk_mol.get_bonds())
+        sha.update(repr(bonds).encode())
+        sha.update(stage.encode())
+        sha.update(repr(sorted((parameters or {}).items())).encode())
+        return sha.hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.path / key[:2] / f'{key}.npz'
+
+    def get(self, key: str):
+        'return the CacheEntry for a key, or None if it is not cached'
+        entry_path = self._entry_path(key)
+        try:
+            with np.load(entry_path) as entry:
+                positions = entry['positions'] if 'positions' in entry else None
+                energy = float(entry['energy']) if 'energy' in entry else None
+                steps = int(entry['steps']) if 'steps' in entry else None
+                fmax = float(entry['fmax']) if 'fmax' in entry else None
+            os.utime(entry_path)
+        except (FileNotFoundError, OSError, ValueError, KeyError):
+            # missing, evicted by another process or truncated
+            return None
+        return CacheEntry(positions, energy, steps, fmax)
+
+    def put(self, key: str, positions=None, energy: float = None, steps: int = None, fmax: float = None) -> None:
+        entry_path = self._entry_path(key)
+        entry_path.parent.mkdir(parents=True, exist_ok=True)
+        arrays = {name: np.asarray(value)
+                  for name, value in (('positions', positions), ('energy', energy), ('steps', steps), ('fmax', fmax))
+                  if value is not None}
+        with tempfile.NamedTemporaryFile(dir=entry_path.parent, suffix='.tmp', delete=False) as file:
+            np.savez(file, **arrays)
+        os.replace(file.name, entry_path)
+
+        # check the cache size about once per 5% of max_bytes written, from whichever process
+        if random.random() < 20 * entry_path.stat().st_size / self.max_bytes:
+            self.evict()
+
+    def evict(self) -> None:
+        'remove least recently used entries until the cache is below 90% of max_bytes'
+        entries = []
+        for entry_path in self.path.glob('*/*.npz'):
+            try:
+                stat = entry_path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry_path))
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, entry_path in sorted(entries):
+            if total_bytes <= 0.9 * self.max_bytes:
+                break
+            try:
+                entry_path.unlink()
+            except FileNotFoundError: # already evicted by another process
+                pass
+            total_bytes -= size
+
+
+@dataclass
+class CachedCalculation:
+    '''Serves the results of a per molecule calculation from a StageCache
+
+    The calculation takes an stk molecule and returns an optimized stk molecule, an energy or an
+    OptimizationResult. Failed calculations (returning None) are not cached.
+    '''
+    calculation: Callable
+    cache: StageCache
+    stage: str
+    parameters: dict = field(default_factory=dict)
+
+    def __call__(self, stk_mol: stk.Molecule):
+        key = self.cache.key(stk_mol, self.stage, self.parameters)
+        entry = self.cache.get(key)
+        if entry is not None:
+            if entry.positions is None:
+                return entry.energy
+            if entry.energy is None:
+                return stk_mol.with_position_matrix(entry.positions)
+            return OptimizationResult(stk_mol.with_position_matrix(entry.positions), *entry[1:])
+
+        result = self.calculation(stk_mol)
+        if isinstance(result, OptimizationResult):
+            self.cache.put(key, result.stk_mol.get_position_matrix(), *result[1:])
+        elif isinstance(result, stk.Molecule):
+            self.cache.put(key, positions=result.get_position_matrix())
+        elif result is not None:
+            self.cache.put(key, energy=result)
+        return result
@@ -0,0 +1,26 @@
+from xtb.ase import calculator
+
+# xTB calculator owned by this process, reused by every xTB task the process runs
+_xtb_calculator = None
+
+
+def init_xtb_worker(method: str = 'GFN2-xTB') -> None:
+    'process pool initializer that sets up the xTB calculator of a worker once'
+    global _xtb_calculator
+    _xtb_calculator = calculator.XTB(method=method)
+
+
+def xtb_calculator(method: str = 'GFN2-xTB') -> calculator.XTB:
+    '''Return the xTB calculator of this process, to calculate a new molecule or conformer
+
+    It is not fully reset between molecules: ASE compares each molecule to the last one
+    calculated, and xtb-python keeps its set up API calculator if only the positions changed, as
+    between conformers of the same complex. It builds a new one if the atoms, charges or spins
+    differ. The wavefunction of the previous molecule is dropped, as xtb-python would otherwise
+    start the SCF from it, so results do not depend on which conformers the worker ran before.
+    Processes that were not started with init_xtb_worker set up their calculator on first use.
+    '''
+    if _xtb_calculator is None or _xtb_calculator.parameters.method != method:
+        init_xtb_worker(method)
+    _xtb_calculator._res = None
+    return _xtb_calculator
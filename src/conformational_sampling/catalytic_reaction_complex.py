@@ -1,5 +1,8 @@
 import logging
+import random
 from dataclasses import dataclass, field
+from itertools import product
+from math import prod
 
 import stk
 
@@ -7,10 +10,47 @@ from conformational_sampling.config import Config
 from conformational_sampling.main import (
     ConformerEnsembleOptimizer,
     bind_ligands,
-    gen_confs_openbabel,
+    gen_confs_openbabel_concurrently,
 )
 
 
+def unravel_index(index, sizes):
+    'convert an index into the flattened cartesian product of ranges with the given sizes'
+    indices = []
+    for size in reversed(sizes):
+        index, remainder = divmod(index, size)
+        indices.append(remainder)
+    return tuple(reversed(indices))
+
+
+def sample_product_indices(sizes, max_samples=None, sampling='random', seed=0):
+    """Lazily generate index tuples into the cartesian product of ranges with the given sizes
+
+    All index tuples are generated if max_samples is None or at least the size of the product.
+    Otherwise max_samples index tuples are sampled without replacement, either uniformly
+    ('random') or spread as evenly as possible over the values of the first index ('stratified').
+    """
+    total = prod(sizes)
+    if max_samples is None or max_samples >= total:
+        yield from product(*(range(size) for size in sizes))
+        return
+
+    rng = random.Random(seed)
+    if sampling == 'random':
+        for index in sorted(rng.sample(range(total), max_samples)):
+            yield unravel_index(index, sizes)
+    elif sampling == 'stratified':
+        first_size, *other_sizes = sizes
+        quotas = [max_samples // first_size] * first_size
+        for i in rng.sample(range(first_size), max_samples % first_size):
+            quotas[i] += 1
+        for i, quota in enumerate(quotas):
+            for index in sorted(rng.sample(range(prod(other_sizes)), quota)):
+                yield (i, *unravel_index(index, other_sizes))
+    else:
+        raise ValueError(f'unknown sampling method {sampling!r}')
+
+
 @dataclass
 class CatalyticReactionComplex:
     metal: stk.BuildingBlock
@@ -29,27 +69,55 @@ class CatalyticReactionComplex:
         )
 
     def gen_conformers(self):
-        reactive_ligand_1_conformers = gen_confs_openbabel(
-            self.reactive_ligand_1, self.config
+        (
+            reactive_ligand_1_conformers,
+            reactive_ligand_2_conformers,
+            ancillary_ligand_conformers,
+        ) = gen_confs_openbabel_concurrently(
+            [self.reactive_ligand_1, self.reactive_ligand_2, self.ancillary_ligand],
+            self.config,
         )
-        reactive_ligand_2_conformers = gen_confs_openbabel(
-            self.reactive_ligand_2, self.config
+        unoptimized_conformers = self.iter_unoptimized_conformers(
+            ancillary_ligand_conformers,
+            reactive_ligand_1_conformers,
+            reactive_ligand_2_conformers,
         )
-        ancillary_ligand_conformers = gen_confs_openbabel(
-            self.ancillary_ligand, self.config
-        )
-        self.unoptimized_conformers = [
-            bind_ligands(self.metal, ancillary, ligand_1, ligand_2)
-            for ancillary in ancillary_ligand_conformers
-            for ligand_1 in reactive_ligand_1_conformers
-            for ligand_2 in reactive_ligand_2_conformers
-        ]
         self.optimized_conformers = ConformerEnsembleOptimizer(
-            self.unoptimized_conformers, self.config
+            unoptimized_conformers, self.config
         ).optimize()
         logging.debug('Finished generating CatalyticReactionComplex conformers')
         return self.optimized_conformers
 
+    def iter_unoptimized_conformers(
+        self,
+        ancillary_ligand_conformers,
+        reactive_ligand_1_conformers,
+        reactive_ligand_2_conformers,
+    ):
+        """Lazily bind each sampled combination of ligand conformers to the metal"""
+        ligand_conformers = (
+            ancillary_ligand_conformers,
+            reactive_ligand_1_conformers,
+            reactive_ligand_2_conformers,
+        )
+        sizes = [len(conformers) for conformers in ligand_conformers]
+        logging.debug(
+            f'{prod(sizes)} ligand conformer combinations, '
+            f'max_complexes={self.config.max_complexes}'
+        )
+        for i, j, k in sample_product_indices(
+            sizes,
+            self.config.max_complexes,
+            self.config.complex_sampling,
+            self.config.random_seed,
+        ):
+            yield bind_ligands(
+                self.metal,
+                ancillary_ligand_conformers[i],
+                reactive_ligand_1_conformers[j],
+                reactive_ligand_2_conformers[k],
+            )
+
     def gen_reductive_elim_drive_coords(self):
         """Generate reductive elimination driving coordinates for this complex"""
         breaking_bonds = []
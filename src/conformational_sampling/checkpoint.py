@@ -0,0 +1,74 @@
+import logging
+import os
+import pickle
+import signal
+from pathlib import Path
+
+# checkpoints open in this process by id, synced by the handler of sync_on_signals
+_open_checkpoints = {}
+
+
+class Checkpoint:
+    '''Append-only record of the progress of a conformer ensemble optimization
+
+    Each record is a tuple pickled to the end of the file and flushed as soon as the task that
+    produced it completes, so a job killed at any point loses at most the record being written.
+    '''
+    def __init__(self, path: Path, append: bool = False) -> None:
+        self.path = Path(path)
+        self.file = open(self.path, 'ab' if append else 'wb')
+        _open_checkpoints[id(self)] = self
+
+    def record(self, *record) -> None:
+        pickle.dump(record, self.file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.file.flush()
+
+    def sync(self) -> None:
+        'make sure all records are on disk, not just handed to the operating system'
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self) -> None:
+        _open_checkpoints.pop(id(self), None)
+        self.file.close()
+
+    @staticmethod
+    def read(path: Path) -> list:
+        'read all complete records, dropping a final record that was only partially written'
+        records = []
+        with open(path, 'rb') as file:
+            complete_size = 0
+            while True:
+                try:
+                    records.append(pickle.load(file))
+                except EOFError:
+                    break
+                except Exception: # truncated record from a killed job
+                    logging.warning(f'Discarding partial checkpoint record at byte {complete_size} of {path}')
+                    break
+                complete_size = file.tell()
+        # drop any partial record so new records can be appended after the complete ones
+        os.truncate(path, complete_size)
+        return records
+
+
+def sync_on_signals(signums=(signal.SIGTERM, signal.SIGUSR1)) -> dict:
+    '''Sync every open checkpoint to disk when a signal arrives, then let the signal terminate the job
+
+    SLURM sends SIGTERM at the time limit, and can send SIGUSR1 ahead of time with
+    #SBATCH --signal=B:USR1@<seconds>. Handlers can only be installed from the main thread, but
+    they also sync the checkpoints of optimizations running in other threads, such as the ligands
+    of a screen. Returns the previous handlers so they can be restored.
+    '''
+    def handler(signum, frame):
+        # copied at once, checkpoints may be opened and closed by other threads meanwhile
+        for checkpoint in list(_open_checkpoints.values()):
+            logging.warning(f'Received {signal.Signals(signum).name}, syncing checkpoint {checkpoint.path}')
+            try:
+                checkpoint.sync()
+            except (ValueError, RuntimeError): # closed or being written by this thread
+                logging.exception(f'Could not sync checkpoint {checkpoint.path}')
+        signal.signal(signum, signal.SIG_DFL)
+        os.kill(os.getpid(), signum)
+
+    return {signum: signal.signal(signum, handler) for signum in signums}
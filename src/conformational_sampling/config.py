@@ -9,14 +9,90 @@ from conformational_sampling import utils
 class Config:
     xtb_path: str = 'xtb'
     initial_conformers: int = 100
+    # settings of the openbabel genetic algorithm conformer search of each ligand
+    ob_num_children: int = 5
+    ob_mutability: int = 5
+    # number of generations without improvement before the search stops
+    ob_convergence: int = 5
     # initial_rms_threshold: float = 0.6 # NOT NEEDED IN OPENBABEL IMPLEMENTATION
     max_connectivity_changes: int = 2
     pre_xtb_rms_threshold: float = 2.0
+    # align conformers before computing the RMS for uniqueness filtering (rdkit's CalcRMS does not)
+    rms_align: bool = False
+    # only conformers within this window (kcal/mol) of the lowest xTB energy are optimized with DFT
+    # (None to optimize all)
+    dft_energy_window: float = None
+    # max number of the lowest xTB energy conformers optimized with DFT (None for no limit)
+    max_dft_conformers: int = None
+    # RMS threshold for removing conformers that became duplicates during xTB optimization (None to skip)
+    post_xtb_rms_threshold: float = None
+    # stop a DFT optimization once its energy has been more than this (kcal/mol) above the lowest
+    # DFT energy found so far for dft_abort_patience consecutive steps (None to never stop early)
+    dft_abort_window: float = None
+    dft_abort_patience: int = 3
+    # ASE optimizer of the DFT stage: 'BFGS', 'BFGSLineSearch', 'FIRE' or 'PreconLBFGS'
+    dft_optimizer: str = 'BFGS'
+    # start the BFGS optimizers of the DFT stage from the xTB Hessian of the starting geometry
+    # instead of a constant diagonal one, costing 6 xTB gradients per atom (ignored for FIRE and
+    # PreconLBFGS, which do not use a Hessian)
+    dft_xtb_hessian: bool = False
+    # save the positions, energy and fmax of every DFT optimization step to
+    # scratch/dft_optimize_{i}/trajectory.npz (see trajectories.load_trajectory)
+    save_dft_trajectories: bool = False
     # max number of BFGS geometry optimization steps; low default for debugging speed
     max_dft_opt_steps: int = 2
     # number of cpus to use for each dft geometry optimization
     # the number of simultaneous conformers that can be optimized is num_cpus//dft_cpus_per_opt
     dft_cpus_per_opt: int = 1
+    # number of cpus (OpenMP threads) for each xTB optimization, MCHammer and the metal optimizer
+    # share the same num_cpus//xtb_cpus_per_opt worker processes
+    xtb_cpus_per_opt: int = 1
+    # number of cpus for each GSM run of stk_se_de_gsm_single_node_parallel
+    gsm_cpus_per_run: int = 1
     num_cpus: int = field(default_factory=utils.num_cpus)
+    # cores of num_cpus set aside for the DFT executor while screening ligands concurrently, the
+    # rest run the stages up to xTB (half of them if None)
+    screen_dft_cpus: int = None
+    # where tasks run: 'process' for a process pool on this node, 'dask' for a dask distributed
+    # cluster and 'slurm' for dask workers submitted as SLURM jobs (see executors.stage_executor)
+    executor: str = 'process'
+    # address of a running dask scheduler, a LocalCluster is started if None
+    dask_scheduler_address: str = None
+    # keyword arguments of dask_jobqueue.SLURMCluster, e.g. queue, memory, walltime
+    slurm_cluster_options: dict = field(default_factory=dict)
+    # max number of SLURM worker jobs running at once, scaled with the number of queued tasks
+    slurm_max_jobs: int = 10
+    # advance each conformer to its next stage as soon as it finishes the previous one instead of
+    # waiting for the whole ensemble at every stage (uniqueness filtering then depends on finish order)
+    streaming: bool = False
+    # max number of unoptimized conformers to build and queue for optimization at a time
+    chunk_size: int = 1000
+    # cap on the number of ligand conformer combinations bound into complexes (None for all)
+    max_complexes: int = None
+    # 'random' samples combinations uniformly, 'stratified' spreads them evenly over the
+    # ancillary ligand conformers
+    complex_sampling: str = 'random'
+    random_seed: int = 0
+    # before MCHammer, 'reject' drops complexes whose ligands clash and 'rank' optimizes the least
+    # clashing complexes first (None to disable)
+    clash_filter: str = None
+    # atoms of different ligands clash if closer than this fraction of their van der Waals radii sum
+    clash_vdw_scale: float = 0.5
     ase_calculator: Calculator = None
+    # directory of a persistent cache of stage results that can be shared between runs and jobs, which
+    # also holds the ligand conformer searches so that reruns start from the same geometries
+    cache_path: Path = None
+    # least recently used cache entries are evicted beyond this size
+    cache_max_bytes: int = 10 * 2**30
+    # directory of the xyz output files and the scratch directory of the calculations
+    output_dir: Path = Path()
+    # SQLite ligand library (see library.LigandLibrary) that gen_ligand_library_entry adds each
+    # ligand's conformers to, shared by all jobs of a screen (None to only write xyz files)
+    library_path: Path = None
+    # write profile_summary.json and profile_trace.json (trace events for Perfetto or
+    # chrome://tracing) to output_dir, with the wall and CPU time, worker, queue wait and peak RSS
+    # of every stage and task, and the calculator calls of each conformer (see profiling.Profiler)
+    profile: bool = False
+    # file recording each completed stage so an interrupted job can be resumed where it stopped
+    checkpoint_path: Path = None
     restart_gsm: Path = None
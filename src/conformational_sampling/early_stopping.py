@@ -0,0 +1,76 @@
+import os
+import tempfile
+from pathlib import Path
+from typing import NamedTuple
+
+from ase.units import kcal, mol
+
+
+class Pruned(NamedTuple):
+    'result of an optimization that was stopped because its energy left the energy window'
+    energy: float
+    steps: int
+
+
+class EnergyWindowExceeded(Exception):
+    pass
+
+
+class BestEnergyBoard:
+    '''Lowest energy found so far by any of the optimizations sharing a directory
+
+    Each optimization writes the lowest energy it has reached to its own file, replaced
+    atomically, so workers in different processes or on different nodes of a shared filesystem
+    can publish and read energies without locks.
+    '''
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def publish(self, name: str, energy: float) -> None:
+        with tempfile.NamedTemporaryFile('w', dir=self.path, suffix='.tmp', delete=False) as file:
+            file.write(repr(energy))
+        os.replace(file.name, self.path / f'{name}.energy')
+
+    def best(self) -> float:
+        best = float('inf')
+        for energy_path in self.path.glob('*.energy'):
+            try:
+                best = min(best, float(energy_path.read_text()))
+            except (FileNotFoundError, ValueError): # replaced or cleared while reading
+                pass
+        return best
+
+    def clear(self) -> None:
+        for energy_path in self.path.glob('*.energy'):
+            energy_path.unlink(missing_ok=True)
+
+
+class EnergyWindowObserver:
+    '''ASE optimizer observer stopping an optimization that stays above the best energy
+
+    After each step the energy of the optimized atoms is published to the board and compared to
+    the best energy of all optimizations. Once it has been more than window (kcal/mol) above the
+    best for patience consecutive steps, EnergyWindowExceeded is raised out of the optimizer.
+    '''
+    def __init__(self, atoms, board: BestEnergyBoard, name: str, window: float, patience: int) -> None:
+        self.atoms = atoms
+        self.board = board
+        self.name = name
+        self.window = window * kcal / mol
+        self.patience = patience
+        self.lowest = float('inf')
+        self.steps_above = 0
+
+    def __call__(self) -> None:
+        # energy of the geometry the optimizer step just evaluated, cached by the calculator
+        energy = self.atoms.get_potential_energy()
+        if energy < self.lowest:
+            self.lowest = energy
+            self.board.publish(self.name, energy)
+        if energy > self.board.best() + self.window:
+            self.steps_above += 1
+        else:
+            self.steps_above = 0
+        if self.steps_above >= self.patience:
+            raise EnergyWindowExceeded(f'{self.name} stayed {self.steps_above} steps above the energy window')
@@ -0,0 +1,176 @@
+from collections.abc import Mapping
+
+import numpy as np
+import stk
+
+from conformational_sampling.bonds import adjacency_matrix, num_connectivity_differences, perceive_bonds
+from conformational_sampling.utils import stk_mol_symbols
+
+# bounds the size of the (conformers x atoms x atoms x 3) difference arrays of bond perception
+MAX_BATCH_ELEMENTS = 2**24
+
+
+class ConformerEnsemble:
+    '''Conformers of one molecule at each optimization stage, stored as arrays
+
+    All conformers share the atoms, bonds and building block information of the template, so it
+    is stored once and only the positions are kept per conformer and stage, in an array of shape
+    (num_conformers, num_stages, num_atoms, 3). Energies are kept in a parallel array of shape
+    (num_conformers, num_stages). stk molecules are only built when asked for with molecule().
+    '''
+    def __init__(self, template: stk.Molecule, num_stages: int, capacity: int = 16) -> None:
+        self.template = template
+        self.num_stages = num_stages
+        self.symbols = stk_mol_symbols(template)
+        self.num_conformers = 0
+        self._positions = np.full((capacity, num_stages, template.get_num_atoms(), 3), np.nan)
+        self._energies = np.full((capacity, num_stages), np.nan)
+        self._completed = np.zeros((capacity, num_stages), dtype=bool)
+        self._failed = np.zeros((capacity, num_stages), dtype=bool)
+        # stopped early because the conformer was not competitive, not a failure
+        self._pruned = np.zeros((capacity, num_stages), dtype=bool)
+        # convergence of the optimizations, -1 steps and nan fmax where not recorded
+        self._steps = np.full((capacity, num_stages), -1)
+        self._fmax = np.full((capacity, num_stages), np.nan)
+        # bonds differing from the template after perceiving them from the positions, -1 where not computed
+        self._connectivity_changes = np.full((capacity, num_stages), -1)
+
+    def __len__(self) -> int:
+        return self.num_conformers
+
+    @property
+    def positions(self):
+        return self._positions[:self.num_conformers]
+
+    @property
+    def energies(self):
+        'energies of each conformer and stage, nan where not computed'
+        return self._energies[:self.num_conformers]
+
+    @property
+    def completed(self):
+        'whether each conformer has positions for each stage'
+        return self._completed[:self.num_conformers]
+
+    @property
+    def failed(self):
+        return self._failed[:self.num_conformers]
+
+    @property
+    def pruned(self):
+        return self._pruned[:self.num_conformers]
+
+    @property
+    def steps(self):
+        return self._steps[:self.num_conformers]
+
+    @property
+    def fmax(self):
+        return self._fmax[:self.num_conformers]
+
+    def append(self, positions, stage: int = 0) -> int:
+        'add a conformer with positions for the given stage, returning its index'
+        if self.num_conformers == len(self._positions):
+            # double the capacity of every array
+            (self._positions, self._energies, self._completed, self._failed, self._pruned,
+             self._steps, self._fmax, self._connectivity_changes) = (
+                np.concatenate([array, np.full_like(array, fill_value)])
+                for array, fill_value in ((self._positions, np.nan), (self._energies, np.nan),
+                                          (self._completed, False), (self._failed, False),
+                                          (self._pruned, False), (self._steps, -1), (self._fmax, np.nan),
+                                          (self._connectivity_changes, -1))
+            )
+        i = self.num_conformers
+        self.num_conformers += 1
+        self.set_positions(i, stage, positions)
+        return i
+
+    def set_positions(self, i: int, stage: int, positions) -> None:
+        self.positions[i, stage] = positions
+        self.completed[i, stage] = True
+        self._connectivity_changes[i, stage] = -1
+
+    def set_energy(self, i: int, stage: int, energy: float) -> None:
+        self.energies[i, stage] = energy
+
+    def set_failed(self, i: int, stage: int) -> None:
+        self.failed[i, stage] = True
+
+    def set_pruned(self, i: int, stage: int) -> None:
+        self.pruned[i, stage] = True
+
+    def set_convergence(self, i: int, stage: int, steps: int, fmax: float) -> None:
+        self.steps[i, stage] = steps
+        self.fmax[i, stage] = np.nan if fmax is None else fmax
+
+    def connectivity_changes(self, stage: int):
+        '''Number of bonds perceived from the positions of each conformer at a stage that differ
+        from the bonds of the template, -1 for the conformers that did not complete the stage
+
+        Results are cached per conformer, and the bonds of the conformers not computed yet are
+        perceived in vectorized calls over chunks of up to MAX_BATCH_ELEMENTS array elements.
+        '''
+        changes = self._connectivity_changes[:self.num_conformers, stage]
+        missing = np.flatnonzero(self.completed[:, stage] & (changes < 0))
+        if len(missing):
+            numbers = [atom.get_atomic_number() for atom in self.template.get_atoms()]
+            template_adjacency = adjacency_matrix(self.template)
+            num_atoms = len(numbers)
+            chunk_size = max(1, MAX_BATCH_ELEMENTS // (num_atoms * num_atoms * 3))
+            for start in range(0, len(missing), chunk_size):
+                chunk = missing[start:start + chunk_size]
+                adjacency = perceive_bonds(numbers, self.positions[chunk, stage])
+                changes[chunk] = num_connectivity_differences(adjacency, template_adjacency)
+        return changes.copy()
+
+    def molecule(self, i: int, stage: int) -> stk.Molecule:
+        if not self.completed[i, stage]:
+            raise KeyError(stage)
+        return self.template.with_position_matrix(self.positions[i, stage])
+
+    def reorder(self, order) -> None:
+        'rearrange the conformers so that conformer order[j] becomes conformer j'
+        order = np.asarray(order, dtype=int)
+        for array in (self.positions, self.energies, self.completed, self.failed, self.pruned,
+                      self.steps, self.fmax, self._connectivity_changes[:self.num_conformers]):
+            array[:] = array[order]
+
+
+class StageMolecules(Mapping):
+    'read-only mapping from the completed stages of one conformer to stk molecules built on access'
+    def __init__(self, ensemble: ConformerEnsemble, i: int) -> None:
+        self.ensemble = ensemble
+        self.i = i
+
+    def __getitem__(self, stage):
+        return self.ensemble.molecule(self.i, stage)
+
+    def __contains__(self, stage) -> bool:
+        return 0 <= stage < self.ensemble.num_stages and bool(self.ensemble.completed[self.i, stage])
+
+    def __iter__(self):
+        return iter(np.flatnonzero(self.ensemble.completed[self.i]).tolist())
+
+    def __len__(self) -> int:
+        return int(self.ensemble.completed[self.i].sum())
+
+
+class StageEnergies(Mapping):
+    'read-only mapping from the stages of one conformer with a computed energy to the energy'
+    def __init__(self, ensemble: ConformerEnsemble, i: int) -> None:
+        self.ensemble = ensemble
+        self.i = i
+
+    def __getitem__(self, stage):
+        if stage not in self:
+            raise KeyError(stage)
+        return float(self.ensemble.energies[self.i, stage])
+
+    def __contains__(self, stage) -> bool:
+        return 0 <= stage < self.ensemble.num_stages and not np.isnan(self.ensemble.energies[self.i, stage])
+
+    def __iter__(self):
+        return iter(np.flatnonzero(~np.isnan(self.ensemble.energies[self.i])).tolist())
+
+    def __len__(self) -> int:
+        return int((~np.isnan(self.ensemble.energies[self.i])).sum())
@@ -0,0 +1,82 @@
+from contextlib import contextmanager
+
+from conformational_sampling.config import Config
+from conformational_sampling.scheduling import CoreBudget, limit_threads
+
+# values of Config.executor
+PROCESS = 'process'
+DASK = 'dask'
+SLURM = 'slurm'
+
+
+def worker_setup_plugin(threads: int, initializer=None, initargs=()):
+    'dask worker plugin doing the same setup as the process pool initializer of a stage'
+    from distributed import WorkerPlugin
+
+    class WorkerSetup(WorkerPlugin):
+        name = 'conformational-sampling-worker-setup'
+
+        def setup(self, worker) -> None:
+            limit_threads(threads)
+            if initializer is not None:
+                initializer(*initargs)
+
+    return WorkerSetup()
+
+
+@contextmanager
+def dask_executor(cluster_or_address, threads: int, initializer=None, initargs=()):
+    'concurrent.futures style executor of a dask distributed client, with worker setup'
+    from distributed import Client
+
+    with Client(cluster_or_address) as client:
+        plugin = worker_setup_plugin(threads, initializer, initargs)
+        if hasattr(client, 'register_plugin'):
+            client.register_plugin(plugin)
+        else: # distributed < 2023.9
+            client.register_worker_plugin(plugin)
+        # shutting down the executor waits for submitted tasks before the client closes
+        with client.get_executor() as executor:
+            yield executor
+
+
+@contextmanager
+def stage_executor(config: Config, threads_per_task: int = 1, initializer=None, initargs=(),
+                   budget: CoreBudget = None):
+    '''Executor for the tasks of a stage, chosen by config.executor
+
+    'process' runs a process pool on this node within the core budget of config.num_cpus.
+    'dask' connects to the dask scheduler at config.dask_scheduler_address, or starts a
+    LocalCluster of the same shape as the process pool if no address is set. 'slurm' submits dask
+    workers as SLURM jobs with dask_jobqueue, each job running one task at a time with
+    threads_per_task cores, and adapts the number of jobs to the queued tasks up to
+    config.slurm_max_jobs. dask and dask_jobqueue are only imported when used, they are
+    installed with the dask extra. budget replaces the CoreBudget of config.num_cpus on this
+    node, e.g. with a share of it from CoreBudget.split.
+    '''
+    if budget is None:
+        budget = CoreBudget(config.num_cpus)
+    if config.executor == PROCESS:
+        with budget.executor(threads_per_task, initializer, initargs) as executor:
+            yield executor
+    elif config.executor == DASK:
+        if config.dask_scheduler_address is not None:
+            with dask_executor(config.dask_scheduler_address, threads_per_task, initializer, initargs) as executor:
+                yield executor
+            return
+        from distributed import LocalCluster
+
+        shape = budget.shape(threads_per_task)
+        with LocalCluster(n_workers=shape.processes, threads_per_worker=1, processes=True,
+                          dashboard_address=None) as cluster:
+            with dask_executor(cluster, shape.threads, initializer, initargs) as executor:
+                yield executor
+    elif config.executor == SLURM:
+        from dask_jobqueue import SLURMCluster
+
+        with SLURMCluster(cores=threads_per_task, processes=1, **config.slurm_cluster_options) as cluster:
+            cluster.adapt(minimum_jobs=0, maximum_jobs=config.slurm_max_jobs)
+            with dask_executor(cluster, threads_per_task, initializer, initargs) as executor:
+                yield executor
+    else:
+        raise ValueError(f'unknown executor {config.executor!r}')
@@ -1,7 +1,5 @@
 import os
 import sys
-from concurrent.futures import ProcessPoolExecutor
-from itertools import repeat
 from pathlib import Path
 
 import pyGSM
@@ -26,14 +24,26 @@ from pyGSM.potential_energy_surfaces import PES
 from pyGSM.utilities import elements, manage_xyz, nifty
 from pyGSM.utilities.cli_utils import get_driving_coord_prim
 from pyGSM.utilities.cli_utils import plot as gsm_plot
-from xtb.ase import calculator
 
+from conformational_sampling.accounting import CountingCalculator, counting_calculator
+from conformational_sampling.calculators import init_xtb_worker, xtb_calculator
 from conformational_sampling.config import Config
+from conformational_sampling.executors import stage_executor
+from conformational_sampling.profiling import Profiler, span
 
 # from conformational_sampling.analyze import ts_node
 
 OPT_STEPS = 50 # 10 for debugging, 50 for production
 
+
+class CountingASELoT(ASELoT):
+    'ASELoT tagging the calls of a CountingCalculator with the string node it computes'
+    def run(self, *args, **kwargs):
+        if isinstance(self.ase_calculator, CountingCalculator):
+            self.ase_calculator.tag = getattr(self, 'node_id', None)
+        return super().run(*args, **kwargs)
+
+
 def stk_mol_to_gsm_objects(stk_mol: stk.Molecule):
     ELEMENT_TABLE = elements.ElementData()
     # atoms is a list of pygsm element objects
@@ -60,20 +70,28 @@ def stk_se_de_gsm(
     """Run pyGSM (changes directory, so run in its own process)"""
     path.mkdir(parents=True, exist_ok=True)
     os.chdir(path)
-    stk_se_gsm(
-        stk_mol=stk_mol,
-        driving_coordinates=driving_coordinates,
-        config=config,
-    )
-    stk_de_gsm(config=config)
+    with span('se_gsm'):
+        stk_se_gsm(
+            stk_mol=stk_mol,
+            driving_coordinates=driving_coordinates,
+            config=config,
+        )
+    with span('de_gsm'):
+        stk_de_gsm(config=config)
 
 
 def stk_se_de_gsm_single_node_parallel(stk_mols, driving_coordinates, config: Config):
     paths = [Path.cwd() / f'scratch/pystring_{i}' for i in range(len(stk_mols))]
-    with ProcessPoolExecutor(max_workers=config.num_cpus) as executor:
-        executor.map(
-            stk_se_de_gsm, paths, stk_mols, repeat(driving_coordinates), repeat(config)
+    # without a configured calculator, each worker reuses one xTB calculator for all of its runs
+    initializer = init_xtb_worker if config.ase_calculator is None else None
+    profiler = Profiler(config.profile)
+    with profiler.stage('gsm'), \
+            stage_executor(config, config.gsm_cpus_per_run, initializer=initializer) as executor:
+        profiler.map(
+            executor, 'gsm', range(len(paths)),
+            stk_se_de_gsm, paths, stk_mols, [driving_coordinates] * len(paths), [config] * len(paths)
         )
+    profiler.write(config.output_dir, 'gsm_profile')
 
 
 def stk_gsm(stk_mol: stk.Molecule, driving_coordinates, config: Config):
@@ -86,7 +104,7 @@ def stk_gsm(stk_mol: stk.Molecule, driving_coordinates, config: Config):
     else:
         atoms, xyz, geom = stk_mol_to_gsm_objects(stk_mol)
     
-    lot = ASELoT.from_options(config.ase_calculator, geom=geom)
+    lot = CountingASELoT.from_options(counting_calculator(config.ase_calculator), geom=geom)
 
     nifty.printcool(" Building the PES")
     pes = PES.from_options(
@@ -218,14 +236,14 @@ def stk_gsm_command_line(stk_mol: stk.Molecule, driving_coordinates, config: Con
     )
     
     
-def stk_se_gsm(stk_mol: stk.Molecule, driving_coordinates, config: Config):
-    
+def gsm_reactant(stk_mol: stk.Molecule, driving_coordinates, config: Config):
+    'build the pyGSM reactant Molecule of a complex, with the driving coordinate bonds in its topology'
     nifty.printcool(" Building the LOT")
     atoms, xyz, geom = stk_mol_to_gsm_objects(stk_mol)
     ase_calculator = config.ase_calculator
     if ase_calculator is None:
-        ase_calculator = calculator.XTB()
-    lot = ASELoT.from_options(ase_calculator, geom=geom)
+        ase_calculator = xtb_calculator()
+    lot = CountingASELoT.from_options(counting_calculator(ase_calculator), geom=geom)
     
     nifty.printcool(" Building the PES")
     pes = PES.from_options(
@@ -280,6 +298,12 @@ def stk_se_gsm(stk_mol: stk.Molecule, driving_coordinates, config: Config):
         coord_obj=coord_obj1,
         Form_Hessian=True,
     )
+    return reactant
+
+
+def stk_se_gsm(stk_mol: stk.Molecule, driving_coordinates, config: Config):
+    with span('reactant_setup'):
+        reactant = gsm_reactant(stk_mol, driving_coordinates, config)
 
     nifty.printcool("Creating optimizer")
     optimizer = eigenvector_follow.from_options(Linesearch='backtrack', OPTTHRESH=0.0005, DMAX=0.5, abs_max_step=0.5,
@@ -288,12 +312,13 @@ def stk_se_gsm(stk_mol: stk.Molecule, driving_coordinates, config: Config):
     nifty.printcool("initial energy is {:5.4f} kcal/mol".format(reactant.energy))
 
     nifty.printcool("REACTANT GEOMETRY NOT FIXED!!! OPTIMIZING")
-    optimizer.optimize(
-        molecule=reactant,
-        refE=reactant.energy,
-        opt_steps=OPT_STEPS,
-        # path=path
-    )
+    with span('reactant_optimization'):
+        optimizer.optimize(
+            molecule=reactant,
+            refE=reactant.energy,
+            opt_steps=OPT_STEPS,
+            # path=path
+        )
 
     se_gsm = SE_GSM.from_options(
         reactant=reactant,
@@ -312,7 +337,8 @@ def stk_se_gsm(stk_mol: stk.Molecule, driving_coordinates, config: Config):
     se_gsm.nodes[0].V0 = se_gsm.nodes[0].energy
     print(" Initial energy is %1.4f" % se_gsm.nodes[0].energy)
     se_gsm.add_GSM_nodeR()
-    se_gsm.grow_string(max_iters=50, max_opt_steps=10)
+    with span('string_growth'):
+        se_gsm.grow_string(max_iters=50, max_opt_steps=10)
     if se_gsm.tscontinue:
         se_gsm.pastts = se_gsm.past_ts()
         print("pastts {}".format(se_gsm.pastts))
@@ -367,8 +393,8 @@ def stk_de_gsm(config: Config):
     geoms = manage_xyz.read_xyzs("grown_string_000.xyz")
     ase_calculator = config.ase_calculator
     if ase_calculator is None:
-        ase_calculator = calculator.XTB()
-    lot = ASELoT.from_options(ase_calculator, geom=geoms[0])
+        ase_calculator = xtb_calculator()
+    lot = CountingASELoT.from_options(counting_calculator(ase_calculator), geom=geoms[0])
 
     pes = PES.from_options(lot=lot, ad_idx=0, multiplicity=1)
 
@@ -472,18 +498,20 @@ def stk_de_gsm(config: Config):
     )
 
     nifty.printcool("OPTIMIZING REACTANT GEOMETRY")
-    optimizer.optimize(
-        molecule=reactant,
-        refE=reactant.energy,
-        opt_steps=OPT_STEPS,
-    )
+    with span('reactant_optimization'):
+        optimizer.optimize(
+            molecule=reactant,
+            refE=reactant.energy,
+            opt_steps=OPT_STEPS,
+        )
 
     nifty.printcool("OPTIMIZING PRODUCT GEOMETRY")
-    optimizer.optimize(
-        molecule=product,
-        refE=reactant.energy,
-        opt_steps=OPT_STEPS,
-    )
+    with span('product_optimization'):
+        optimizer.optimize(
+            molecule=product,
+            refE=reactant.energy,
+            opt_steps=OPT_STEPS,
+        )
 
     # For xTB
 
@@ -523,7 +551,8 @@ def stk_de_gsm(config: Config):
     #     ID=2,
     # )
 
-    de_gsm.go_gsm()
+    with span('string_optimization'):
+        de_gsm.go_gsm()
 
     # TS-Optimization following DE-GSM run
 
@@ -0,0 +1,170 @@
+import json
+import random
+import sqlite3
+import time
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+from ase.units import kcal, mol
+
+from conformational_sampling.ensemble import ConformerEnsemble
+
+# seconds a connection waits for another job's write lock before raising 'database is locked'
+BUSY_TIMEOUT = 60
+# attempts of a transaction that still found the database locked after BUSY_TIMEOUT
+RETRIES = 5
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS ligands (
+    id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL,
+    smiles TEXT,
+    symbols TEXT NOT NULL,
+    metadata TEXT,
+    created REAL
+);
+CREATE TABLE IF NOT EXISTS conformers (
+    ligand_id INTEGER NOT NULL REFERENCES ligands (id) ON DELETE CASCADE,
+    conformer INTEGER NOT NULL,
+    stage INTEGER NOT NULL,
+    energy REAL,
+    positions BLOB NOT NULL,
+    PRIMARY KEY (ligand_id, conformer, stage)
+);
+CREATE INDEX IF NOT EXISTS conformers_by_energy ON conformers (stage, ligand_id, energy);
+'''
+
+
+class LibraryConformer(NamedTuple):
+    conformer: int
+    energy: float
+    positions: np.ndarray
+
+
+class LigandLibrary:
+    '''SQLite database of the optimized conformers of many ligands
+
+    Every ligand has a row with its SMILES, element symbols and metadata, and every completed
+    stage of each of its conformers a row with the energy (eV) and the positions as a float64
+    blob. Conformers are numbered in the final order of the ensemble.
+
+    Jobs on different nodes can write to the same library: each ligand is written in one
+    transaction, a connection waits BUSY_TIMEOUT seconds for the lock of another writer and
+    transactions that still find the database locked are retried. The default rollback journal is
+    used instead of WAL, which does not work on network filesystems.
+    '''
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None)
+        self.connection.execute('PRAGMA foreign_keys = ON')
+
+        def create_tables(cursor):
+            for statement in SCHEMA.split(';'):
+                if statement.strip():
+                    cursor.execute(statement)
+
+        self._transaction(create_tables)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def _transaction(self, function):
+        'run function(cursor) in a write transaction, retrying while the database is locked'
+        for attempt in range(RETRIES):
+            cursor = self.connection.cursor()
+            try:
+                # take the write lock up front, so concurrent writers wait instead of deadlocking
+                cursor.execute('BEGIN IMMEDIATE')
+                result = function(cursor)
+                cursor.execute('COMMIT')
+                return result
+            except BaseException as error:
+                if self.connection.in_transaction:
+                    cursor.execute('ROLLBACK')
+                if (not isinstance(error, sqlite3.OperationalError) or 'locked' not in str(error)
+                        or attempt == RETRIES - 1):
+                    raise
+            # back off randomly so the retrying jobs do not collide again
+            time.sleep(random.uniform(0, 2**attempt))
+
+    def add_ensemble(self, name: str, ensemble: ConformerEnsemble, smiles: str = None,
+                     metadata: dict = None) -> None:
+        'store every completed stage of the conformers of a ligand, replacing any previous entry'
+        rows = []
+        for conformer, stage in zip(*np.nonzero(ensemble.completed)):
+            energy = ensemble.energies[conformer, stage]
+            rows.append((int(conformer), int(stage), None if np.isnan(energy) else float(energy),
+                         ensemble.positions[conformer, stage].astype(np.float64).tobytes()))
+
+        def add(cursor):
+            cursor.execute('DELETE FROM ligands WHERE name = ?', (name,))
+            cursor.execute(
+                'INSERT INTO ligands (name, smiles, symbols, metadata, created) VALUES (?, ?, ?, ?, ?)',
+                (name, smiles, ' '.join(ensemble.symbols), json.dumps(metadata or {}), time.time()),
+            )
+            ligand_id = cursor.lastrowid
+            cursor.executemany(
+                'INSERT INTO conformers (ligand_id, conformer, stage, energy, positions) VALUES (?, ?, ?, ?, ?)',
+                ((ligand_id, *row) for row in rows),
+            )
+
+        self._transaction(add)
+
+    def ligands(self) -> list:
+        return [name for name, in self.connection.execute('SELECT name FROM ligands ORDER BY name')]
+
+    def symbols(self, name: str) -> list:
+        row = self.connection.execute('SELECT symbols FROM ligands WHERE name = ?', (name,)).fetchone()
+        if row is None:
+            raise KeyError(name)
+        return row[0].split()
+
+    def metadata(self, name: str) -> dict:
+        row = self.connection.execute('SELECT metadata FROM ligands WHERE name = ?', (name,)).fetchone()
+        if row is None:
+            raise KeyError(name)
+        return json.loads(row[0])
+
+    def energies(self, name: str, stage: int) -> dict:
+        'energies of the conformers of a ligand at a stage, by conformer'
+        return dict(self.connection.execute(
+            'SELECT conformer, energy FROM conformers JOIN ligands ON ligands.id = ligand_id '
+            'WHERE name = ? AND stage = ? AND energy IS NOT NULL ORDER BY conformer',
+            (name, stage),
+        ))
+
+    def lowest_energy_conformer(self, name: str, stage: int) -> LibraryConformer:
+        'the conformer of a ligand with the lowest energy at a stage, None if no energies are stored'
+        row = self.connection.execute(
+            'SELECT conformer, energy, positions FROM conformers JOIN ligands ON ligands.id = ligand_id '
+            'WHERE name = ? AND stage = ? AND energy IS NOT NULL ORDER BY energy LIMIT 1',
+            (name, stage),
+        ).fetchone()
+        if row is None:
+            return None
+        conformer, energy, positions = row
+        return LibraryConformer(conformer, energy, np.frombuffer(positions).reshape(-1, 3))
+
+    def ligands_with_conformers_in_window(self, stage: int, window: float, min_conformers: int) -> dict:
+        '''Ligands with more than min_conformers conformers within window (kcal/mol) of their lowest
+        energy at a stage, mapped to that number of conformers'''
+        return dict(self.connection.execute(
+            '''
+            SELECT name, COUNT(*) FROM conformers
+            JOIN ligands ON ligands.id = conformers.ligand_id
+            JOIN (SELECT ligand_id, MIN(energy) AS lowest FROM conformers
+                  WHERE stage = ? GROUP BY ligand_id) AS lowest_energies
+                ON lowest_energies.ligand_id = conformers.ligand_id
+            WHERE stage = ? AND energy <= lowest + ?
+            GROUP BY conformers.ligand_id HAVING COUNT(*) > ?
+            ORDER BY name
+            ''',
+            (stage, stage, window * kcal / mol, min_conformers),
+        ))
@@ -0,0 +1,68 @@
+import hashlib
+
+import numpy as np
+import stk
+from rdkit import Chem
+
+from conformational_sampling.cache import StageCache
+
+# stage name of ligand conformer searches in the StageCache
+LIGAND_CONFORMERS = 'ligand_conformers'
+
+
+def canonical_ranks(stk_mol: stk.Molecule) -> np.ndarray:
+    'canonical rank of each atom, the same for any atom ordering of the same molecule'
+    rdkit_mol = stk_mol.to_rdkit_mol()
+    rdkit_mol.UpdatePropertyCache(strict=False)
+    return np.array(Chem.CanonicalRankAtoms(rdkit_mol, breakTies=True))
+
+
+def canonical_smiles(stk_mol: stk.Molecule) -> str:
+    rdkit_mol = stk_mol.to_rdkit_mol()
+    rdkit_mol.UpdatePropertyCache(strict=False)
+    return Chem.MolToSmiles(rdkit_mol)
+
+
+def ligand_key(stk_mol: stk.Molecule, ranks, parameters: dict = None) -> str:
+    'hash of the canonical SMILES and functional groups of a ligand along with the search settings'
+    def canonical_ids(ids):
+        return tuple(sorted(int(ranks[i]) for i in ids))
+
+    functional_groups = sorted(
+        (type(functional_group).__name__, canonical_ids(functional_group.get_atom_ids()),
+         canonical_ids(functional_group.get_bonder_ids()), canonical_ids(functional_group.get_deleter_ids()))
+        # only building blocks have functional groups
+        for functional_group in getattr(stk_mol, 'get_functional_groups', tuple)()
+    )
+    sha = hashlib.sha256()
+    sha.update(canonical_smiles(stk_mol).encode())
+    sha.update(repr(functional_groups).encode())
+    sha.update(LIGAND_CONFORMERS.encode())
+    sha.update(repr(sorted((parameters or {}).items())).encode())
+    return sha.hexdigest()
+
+
+class LigandConformerCache:
+    '''Conformer searches of ligands, stored in a StageCache by ligand instead of by geometry
+
+    Entries are keyed by the canonical SMILES, functional groups and search settings of a ligand,
+    and the positions of the conformers are stored in canonical atom order. A ligand built with a
+    different atom order therefore still finds the conformers searched for it in an earlier run.
+    '''
+    def __init__(self, cache: StageCache) -> None:
+        self.cache = cache
+
+    def get(self, stk_mol: stk.Molecule, parameters: dict = None):
+        'return the cached conformers of a ligand, or None if it has not been searched'
+        ranks = canonical_ranks(stk_mol)
+        entry = self.cache.get(ligand_key(stk_mol, ranks, parameters))
+        if entry is None:
+            return None
+        return [stk_mol.with_position_matrix(positions[ranks]) for positions in entry.positions]
+
+    def put(self, stk_mol: stk.Molecule, parameters: dict, conformers: list) -> None:
+        ranks = canonical_ranks(stk_mol)
+        canonical_positions = np.empty((len(conformers), stk_mol.get_num_atoms(), 3))
+        for positions, conformer in zip(canonical_positions, conformers):
+            positions[ranks] = conformer.get_position_matrix()
+        self.cache.put(ligand_key(stk_mol, ranks, parameters), positions=canonical_positions)
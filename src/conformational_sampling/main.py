@@ -1,35 +1,62 @@
 import logging
 import os
 import platform
+import signal
 import sys
-from concurrent.futures import ProcessPoolExecutor
+import threading
+from concurrent.futures import FIRST_COMPLETED, wait
+from contextlib import nullcontext
 from copy import deepcopy
 from importlib.metadata import version
-from itertools import repeat
+from itertools import chain, islice
 from pathlib import Path
 
 import ase
+import numpy as np
 import stk
 import stko
-from ase.io.trajectory import Trajectory
-from ase.optimize import BFGS
+from ase.units import kcal, mol
 from openbabel import pybel as pb
-from rdkit import Chem
-from rdkit.Chem.rdmolfiles import MolToXYZBlock
-from xtb.ase import calculator
 
-from conformational_sampling.ase_stko_optimizer import ASE
+from conformational_sampling.accounting import counting_calculator
+from conformational_sampling.ase_stko_optimizer import ASE, OptimizationResult, max_force
+from conformational_sampling.cache import CachedCalculation, StageCache
+from conformational_sampling.calculators import init_xtb_worker, xtb_calculator
+from conformational_sampling.checkpoint import Checkpoint, sync_on_signals
 from conformational_sampling.config import Config
+from conformational_sampling.early_stopping import (
+    BestEnergyBoard,
+    EnergyWindowExceeded,
+    EnergyWindowObserver,
+    Pruned,
+)
+from conformational_sampling.ensemble import ConformerEnsemble, StageEnergies, StageMolecules
+from conformational_sampling.executors import stage_executor
+from conformational_sampling.library import LigandLibrary
+from conformational_sampling.ligand_cache import LigandConformerCache, canonical_smiles
 from conformational_sampling.metal_complexes import (
     OneLargeTwoSmallMonodentateTrigonalPlanar,
     TwoMonoOneBidentateSquarePlanar,
 )
+from conformational_sampling.optimizers import (
+    HESSIAN_OPTIMIZERS,
+    finite_difference_hessian,
+    make_optimizer,
+    positive_definite,
+)
+from conformational_sampling.output import ConformerWriter
+from conformational_sampling.profiling import Profiler, span
+from conformational_sampling.rmsd import UniqueConformerFilter
+from conformational_sampling.sterics import prune_clashes
+from conformational_sampling.trajectories import TrajectoryRecorder
 from conformational_sampling.utils import (
     num_cpus,
     pybel_mol_to_stk_mol,
     stk_metal,
     stk_mol_to_ase_atoms,
+    stk_mol_symbols,
     stk_mol_to_pybel_mol,
+    xyz_block,
 )
 
 UNOPTIMIZED = 0
@@ -38,6 +65,12 @@ METAL_OPTIMIZER = 2
 XTB = 3
 DFT = 4
 
+# settings of the xTB stage that determine its results
+XTB_PARAMETERS = {'method': 'GFN2-xTB', 'fmax': 0.1}
+
+# lowest energies reached by the DFT optimizations, shared between the DFT workers (in the output_dir)
+DFT_ENERGY_BOARD = Path('scratch', 'dft_best_energies')
+
 NAMES = {UNOPTIMIZED: 'unoptimized', MC_HAMMER: 'mc_hammer', METAL_OPTIMIZER: 'metal_optimizer', XTB: 'xtb', DFT: 'dft'}
 
 print(f'py-conformational-sampling {version("py-conformational-sampling")}')
@@ -47,32 +80,135 @@ logging.debug(f'Platform: {platform.platform()}')
 
 
 class ConformerOptimizationSequence:
-    def __init__(self, unoptimized) -> None:
-        self.stages = {UNOPTIMIZED: unoptimized}
-        self.energies = {}
+    'view of one conformer of a ConformerEnsemble across the optimization stages'
+    def __init__(self, ensemble: ConformerEnsemble, i: int) -> None:
+        self.ensemble = ensemble
+        self.i = i
+        self.stages = StageMolecules(ensemble, i)
+        self.energies = StageEnergies(ensemble, i)
+
+    @property
+    def failed_stages(self):
+        return set(np.flatnonzero(self.ensemble.failed[self.i]).tolist())
     
     def num_connectivity_changes(self):
-        try:
-            return num_connectivity_differences(
-                self.stages[UNOPTIMIZED],
-                reperceive_bonds(self.stages[DFT])
-            )
-        except KeyError:
+        if DFT not in self.stages:
             return None
+        return int(self.ensemble.connectivity_changes(DFT)[self.i])
     
 class ConformerEnsembleOptimizer:
     def __init__(self, unoptimized_conformers, config) -> None:
-        self.conformers = [ConformerOptimizationSequence(conformer) for conformer in unoptimized_conformers]
+        # may be a lazy iterable, conformers are consumed in chunks as they are optimized
+        self.unoptimized_conformers = iter(unoptimized_conformers)
+        if config.clash_filter is not None:
+            # filtered before the conformers are numbered, so a resumed run skips the same ones
+            self.unoptimized_conformers = prune_clashes(
+                self.unoptimized_conformers, config.clash_vdw_scale, config.clash_filter
+            )
+        # created from the first conformer, holds the positions and energies of all conformers
+        self.ensemble = None
         self.config = config
+        self.cache = None
+        if config.cache_path is not None:
+            self.cache = StageCache(config.cache_path, config.cache_max_bytes)
+        self.checkpoint = None
+        self.writer = None
+        self.resumed = False
+        self.profiler = Profiler(config.profile)
         logging.debug(f'{config = }')
+
+    @property
+    def num_conformers(self):
+        return 0 if self.ensemble is None else len(self.ensemble)
+
+    @property
+    def conformers(self):
+        return [ConformerOptimizationSequence(self.ensemble, i) for i in range(self.num_conformers)]
+
+    @classmethod
+    def resume(cls, config, unoptimized_conformers=()):
+        '''Restore an optimization from config.checkpoint_path so that completed work is skipped
+
+        Conformers recorded in the checkpoint are restored from it, so unoptimized_conformers only
+        needs to be given if it was not fully consumed before the job stopped. In that case it must
+        generate the same conformers in the same order, and the recorded ones are skipped.
+        '''
+        optimizer = cls(unoptimized_conformers, config)
+        for kind, *data in Checkpoint.read(config.checkpoint_path):
+            if kind == 'template':
+                template, = data
+                optimizer.ensemble = ConformerEnsemble(template, len(NAMES))
+            elif kind == 'conformer':
+                _, positions = data
+                optimizer.ensemble.append(positions)
+            elif kind == 'stage':
+                i, stage, positions = data
+                if positions is None:
+                    optimizer.ensemble.set_failed(i, stage)
+                else:
+                    optimizer.ensemble.set_positions(i, stage, positions)
+            elif kind == 'energy':
+                i, stage, energy = data
+                optimizer.ensemble.set_energy(i, stage, energy)
+            elif kind == 'convergence':
+                i, stage, steps, fmax = data
+                optimizer.ensemble.set_convergence(i, stage, steps, fmax)
+            elif kind == 'pruned':
+                i, stage = data
+                optimizer.ensemble.set_pruned(i, stage)
+        logging.debug(f'Resumed {optimizer.num_conformers} conformers from {config.checkpoint_path}')
+        optimizer.unoptimized_conformers = islice(optimizer.unoptimized_conformers, optimizer.num_conformers, None)
+        optimizer.resumed = True
+        return optimizer
+
+    def set_stage(self, i, stage, result):
+        'store the optimized molecule or OptimizationResult of a stage for a conformer, None marking a failure'
+        if result is None:
+            self.ensemble.set_failed(i, stage)
+        elif isinstance(result, Pruned):
+            self.ensemble.set_pruned(i, stage)
+            self.ensemble.set_convergence(i, stage, result.steps, None)
+        elif isinstance(result, OptimizationResult):
+            self.ensemble.set_positions(i, stage, result.stk_mol.get_position_matrix())
+            self.ensemble.set_energy(i, stage, result.energy)
+            if result.steps is not None:
+                self.ensemble.set_convergence(i, stage, result.steps, result.fmax)
+        else:
+            self.ensemble.set_positions(i, stage, result.get_position_matrix())
+        self.record_stage(i, stage)
+
+    def record_stage(self, i, stage):
+        'checkpoint and output the result of a stage for a conformer'
+        ensemble = self.ensemble
+        if self.checkpoint is not None:
+            if ensemble.failed[i, stage]:
+                self.checkpoint.record('stage', i, stage, None)
+            elif ensemble.pruned[i, stage]:
+                self.checkpoint.record('pruned', i, stage)
+            elif ensemble.completed[i, stage]:
+                self.checkpoint.record('stage', i, stage, ensemble.positions[i, stage].copy())
+            if not np.isnan(ensemble.energies[i, stage]):
+                self.checkpoint.record('energy', i, stage, float(ensemble.energies[i, stage]))
+            if ensemble.steps[i, stage] >= 0:
+                self.checkpoint.record('convergence', i, stage, int(ensemble.steps[i, stage]),
+                                       float(ensemble.fmax[i, stage]))
+        self.append_output(i, stage)
+
+    def append_output(self, i, stage):
+        if self.writer is not None and self.ensemble.completed[i, stage]:
+            energy = self.ensemble.energies[i, stage]
+            self.writer.append(stage, self.ensemble.positions[i, stage], None if np.isnan(energy) else energy)
     
     def order_conformers(self):
+        if self.ensemble is None:
+            return
         metal_optimized_conformers = []
         xtb_conformers = []
         final_conformers = []
+        # -1 for conformers without a DFT geometry
+        connectivity_changes = self.ensemble.connectivity_changes(DFT)
         for conformer in self.conformers:
-            if (conformer.num_connectivity_changes() is not None
-                and conformer.num_connectivity_changes() <= self.config.max_connectivity_changes):
+            if 0 <= connectivity_changes[conformer.i] <= self.config.max_connectivity_changes:
                 final_conformers.append(conformer)
             elif XTB in conformer.stages:
                 xtb_conformers.append(conformer)
@@ -81,91 +217,288 @@ class ConformerEnsembleOptimizer:
         logging.debug(f'{len(metal_optimized_conformers) = } (pruned before xtb stage)')
         logging.debug(f'{len(xtb_conformers) = } (pruned after xtb stage)')
         logging.debug(f'{len(final_conformers) = } (had <= {self.config.max_connectivity_changes} connectivity changes)')
-        if DFT in conformer.stages:
-            self.conformers = sorted(final_conformers, key=lambda conformer: conformer.energies[DFT])
-            self.conformers += sorted(xtb_conformers, key=lambda conformer: conformer.energies[DFT])
-        self.conformers += metal_optimized_conformers
-        logging.debug(f'{len(self.conformers) = } (total conformers generated)')
+        # conformers whose DFT optimization failed go after those with a DFT energy
+        dft_energy = lambda conformer: conformer.energies.get(DFT, float('inf'))
+        conformers = sorted(final_conformers, key=dft_energy)
+        conformers += sorted(xtb_conformers, key=dft_energy)
+        conformers += metal_optimized_conformers
+        self.ensemble.reorder([conformer.i for conformer in conformers])
+        logging.debug(f'{len(conformers) = } (total conformers generated)')
     
+    def unique_conformer_filter(self, threshold=None):
+        return UniqueConformerFilter(
+            self.ensemble.template,
+            self.config.pre_xtb_rms_threshold if threshold is None else threshold,
+            align=self.config.rms_align,
+        )
+
+    def select_dft_conformers(self, conformer_ids):
+        '''Prune xTB optimized conformers before DFT, returning the rest ordered by xTB energy
+
+        Keeps the conformers within config.dft_energy_window of the lowest xTB energy, removes
+        duplicates among them with config.post_xtb_rms_threshold (keeping the lower energy one)
+        and then keeps at most config.max_dft_conformers.
+        '''
+        if self.ensemble is None:
+            return []
+        conformer_ids = np.array([i for i in conformer_ids if self.ensemble.completed[i, XTB]], dtype=int)
+        if not len(conformer_ids):
+            return []
+        energies = self.ensemble.energies[conformer_ids, XTB]
+        conformer_ids = conformer_ids[np.argsort(energies, kind='stable')]
+        energies = np.sort(energies, kind='stable')
+        num_xtb = len(conformer_ids)
+
+        if self.config.dft_energy_window is not None:
+            window = self.config.dft_energy_window * kcal / mol
+            conformer_ids = conformer_ids[energies <= energies[0] + window]
+        num_in_window = len(conformer_ids)
+
+        if self.config.post_xtb_rms_threshold is not None:
+            unique_filter = self.unique_conformer_filter(self.config.post_xtb_rms_threshold)
+            conformer_ids = [i for i in conformer_ids if unique_filter.add(self.ensemble.molecule(i, XTB))]
+        num_unique = len(conformer_ids)
+
+        conformer_ids = [int(i) for i in conformer_ids[:self.config.max_dft_conformers]]
+        logging.debug(f'{len(conformer_ids)} DFT optimizations of {num_xtb} xTB conformers '
+                      f'({num_xtb - num_in_window} outside the energy window, '
+                      f'{num_in_window - num_unique} duplicates after xTB, '
+                      f'{num_unique - len(conformer_ids)} beyond max_dft_conformers)')
+        return conformer_ids
+
+    def cached(self, calculation, stage_name, parameters=None):
+        'serve a per conformer calculation from the cache if one is configured'
+        if self.cache is None:
+            return calculation
+        return CachedCalculation(calculation, self.cache, stage_name, parameters or {})
+
+    def stage_function(self, stage):
+        calculation, parameters = {
+            MC_HAMMER: (stk.MCHammer().optimize, {}),
+            METAL_OPTIMIZER: (stko.MetalOptimizer().optimize, {}),
+            XTB: (xtb_optimize, XTB_PARAMETERS),
+        }[stage]
+        return self.cached(calculation, NAMES[stage], parameters)
+
+    def next_conformers(self, num_conformers):
+        'consume up to num_conformers unoptimized conformers, returning their indices'
+        start = self.num_conformers
+        for conformer in islice(self.unoptimized_conformers, num_conformers):
+            if self.ensemble is None:
+                self.ensemble = ConformerEnsemble(conformer, len(NAMES))
+            i = self.ensemble.append(conformer.get_position_matrix())
+            if self.checkpoint is not None:
+                if i == 0:
+                    self.checkpoint.record('template', self.ensemble.template)
+                self.checkpoint.record('conformer', i, conformer.get_position_matrix())
+            self.append_output(i, UNOPTIMIZED)
+        return range(start, self.num_conformers)
+
+    def run_stage(self, executor, stage, conformer_ids):
+        'run a stage on the given conformers that have not completed it, starting from their previous stage'
+        conformer_ids = [i for i in conformer_ids
+                         if not self.ensemble.completed[i, stage] and not self.ensemble.failed[i].any()]
+        complexes = self.profiler.map(executor, NAMES[stage], conformer_ids, self.stage_function(stage),
+                                      [self.ensemble.molecule(i, stage - 1) for i in conformer_ids])
+        for i, complex in zip(conformer_ids, complexes):
+            self.set_stage(i, stage, complex)
+
     def get_unique_conformer_ids(self, stage):
-        rdkit_mols = {i: Chem.RemoveHs(conformer.stages[stage].to_rdkit_mol())
-                      for i, conformer in enumerate(self.conformers)
-                      if stage in conformer.stages}
-        unique_indices = []
-        for i, rdkit_mol in rdkit_mols.items():
-            for j in unique_indices:
-                if Chem.AllChem.CalcRMS(rdkit_mol, rdkit_mols[j]) < self.config.pre_xtb_rms_threshold:
-                    break
-            else: # should only get here when conformer is sufficiently unique
-                unique_indices.append(i)
-        
-        return unique_indices
-
-    def optimize(self):
-        with ProcessPoolExecutor(max_workers=self.config.num_cpus) as executor:
-            unoptimized_complexes = [conformer.stages[UNOPTIMIZED] for conformer in self.conformers]
-            mc_hammer_complexes = list(executor.map(stk.MCHammer().optimize, unoptimized_complexes))
-            logging.debug(f'{len(mc_hammer_complexes) = }')
-            for i, conformer in enumerate(self.conformers):
-                conformer.stages[MC_HAMMER] = mc_hammer_complexes[i]
-            metal_optimizer_complexes = list(executor.map(stko.MetalOptimizer().optimize, mc_hammer_complexes))
-            logging.debug(f'{len(metal_optimizer_complexes) = }')
-            for i, conformer in enumerate(self.conformers):
-                conformer.stages[METAL_OPTIMIZER] = metal_optimizer_complexes[i]
-            self.write()
-        
-            # remove duplicate molecules before running xTB
+        if self.ensemble is None:
+            return []
+        unique_filter = self.unique_conformer_filter()
+        return [i for i in range(len(self.ensemble))
+                if self.ensemble.completed[i, stage] and unique_filter.add(self.ensemble.molecule(i, stage))]
+
+    def optimize_staged(self, executor):
+        'run each stage up to xTB for all conformers before starting the next stage'
+        # conformers restored from a checkpoint are completed before new ones are consumed
+        chunk = range(self.num_conformers)
+        while True:
+            for stage in MC_HAMMER, METAL_OPTIMIZER:
+                with self.profiler.stage(NAMES[stage]):
+                    self.run_stage(executor, stage, chunk)
+            chunk = self.next_conformers(self.config.chunk_size)
+            if not chunk:
+                break
+        logging.debug(f'{self.num_conformers = } (metal optimized conformers)')
+
+        # remove duplicate molecules before running xTB
+        with self.profiler.stage('unique_filter'):
             unique_ids = self.get_unique_conformer_ids(METAL_OPTIMIZER)
-            unique_conformers = [self.conformers[i] for i in unique_ids]
-            logging.debug(f'{len(unique_conformers) = }')
-            metal_optimizer_complexes = [conformer.stages[METAL_OPTIMIZER] for conformer in unique_conformers]
-
-            # run xTB on conformers in parallel
-            (Path.cwd() / 'scratch').mkdir(exist_ok=True)
-            xtb_complexes = list(executor.map(ASE(calculator.XTB()).optimize, metal_optimizer_complexes))
-            xtb_complexes = [complex for complex in xtb_complexes if complex is not None]
-            
-            # compute energies
-            energies = list(executor.map(xtb_energy, xtb_complexes))
-            for i, conformer in enumerate(unique_conformers):
-                if i < len(xtb_complexes):
-                    conformer.stages[XTB] = xtb_complexes[i]
-                    conformer.energies[XTB] = energies[i]
-            self.write()
-        
+        logging.debug(f'{len(unique_ids) = }')
+
+        # run xTB on conformers in parallel, which also gives their energies
+        Path(self.config.output_dir, 'scratch').mkdir(parents=True, exist_ok=True)
+        with self.profiler.stage(NAMES[XTB]):
+            self.run_stage(executor, XTB, unique_ids)
+        return unique_ids
+
+    def optimize_streaming(self, executor):
+        '''Run the stages up to xTB, advancing each conformer as soon as its previous stage finishes
+
+        Duplicates are removed incrementally against the conformers accepted so far, so no stage
+        waits on the slowest conformer of the previous stage.
+        '''
+        stage_functions = {stage: self.stage_function(stage) for stage in (MC_HAMMER, METAL_OPTIMIZER, XTB)}
+        futures = {}
+        unique_ids = []
+        unique_filter = None
+
+        def advance(i):
+            'submit the next task of a conformer'
+            nonlocal unique_filter
+            completed = self.ensemble.completed[i]
+            if self.ensemble.failed[i].any():
+                return
+            if not completed[METAL_OPTIMIZER]:
+                stage = METAL_OPTIMIZER if completed[MC_HAMMER] else MC_HAMMER
+                future = self.profiler.submit(executor, NAMES[stage], i, stage_functions[stage],
+                                              self.ensemble.molecule(i, stage - 1))
+                futures[future] = (i, stage)
+                return
+            if unique_filter is None:
+                unique_filter = self.unique_conformer_filter()
+            if not completed[XTB]:
+                metal_optimized = self.ensemble.molecule(i, METAL_OPTIMIZER)
+                if unique_filter.add(metal_optimized):
+                    unique_ids.append(i)
+                    future = self.profiler.submit(executor, NAMES[XTB], i, stage_functions[XTB], metal_optimized)
+                    futures[future] = (i, XTB)
+
+        Path(self.config.output_dir, 'scratch').mkdir(parents=True, exist_ok=True)
+        # conformers restored from a checkpoint that already passed the uniqueness filter
+        for i in range(self.num_conformers):
+            if self.ensemble.completed[i, XTB] or self.ensemble.failed[i, XTB]:
+                if unique_filter is None:
+                    unique_filter = self.unique_conformer_filter()
+                unique_filter.accept(self.ensemble.molecule(i, METAL_OPTIMIZER))
+                unique_ids.append(i)
+        for i in range(self.num_conformers):
+            advance(i)
+        # keep a bounded number of conformers waiting for MCHammer
+        for i in self.next_conformers(self.config.chunk_size):
+            advance(i)
+
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                i, stage = futures.pop(future)
+                self.set_stage(i, stage, future.result())
+                advance(i)
+                if stage == MC_HAMMER:
+                    for j in self.next_conformers(1):
+                        advance(j)
+
+        logging.debug(f'{len(unique_ids) = }')
+        # keep the DFT stage in the original conformer order
+        return sorted(unique_ids)
+
+    def optimize(self, executor=None, dft_executor=None):
+        '''Run all stages on the conformers, returning the final optimized conformers
+
+        The tasks of each stage run on an executor from stage_executor, or on the given executors,
+        which can be shared with other optimizers running in other threads: executor for the
+        stages up to xTB, shaped for xtb_cpus_per_opt, and dft_executor for the DFT stage, shaped
+        for dft_cpus_per_opt.
+        '''
+        if self.ensemble is None:
+            # the first conformer provides the topology shared by the ensemble
+            first = next(self.unoptimized_conformers, None)
+            if first is not None:
+                self.ensemble = ConformerEnsemble(first, len(NAMES))
+                self.unoptimized_conformers = chain([first], self.unoptimized_conformers)
+        self.writer = ConformerWriter(
+            {stage: Path(self.config.output_dir, f'conformers_{stage}_{name}.xyz') for stage, name in NAMES.items()},
+            [] if self.ensemble is None else self.ensemble.symbols,
+            append=self.resumed,
+        )
+        previous_handlers = {}
+        if self.config.checkpoint_path is not None:
+            self.checkpoint = Checkpoint(self.config.checkpoint_path, append=self.resumed)
+            if threading.current_thread() is threading.main_thread():
+                previous_handlers = sync_on_signals()
+        try:
+            unique_ids = self.optimize_unique(executor, dft_executor)
+        finally:
+            for signum, handler in previous_handlers.items():
+                signal.signal(signum, handler)
+            if self.checkpoint is not None:
+                self.checkpoint.close()
+                self.checkpoint = None
+            # rewrite the output files in conformer order
+            with self.profiler.stage('write'):
+                self.write()
+            self.writer.close()
+            self.writer = None
+            self.profiler.write(self.config.output_dir)
+
+        stage = XTB if self.config.ase_calculator is None else DFT
+        return [conformer.stages[stage] for conformer in self.conformers if stage in conformer.stages]
+
+    def stage_executor(self, shared_executor, threads_per_task, initializer=None, initargs=()):
+        'context manager giving the shared executor if there is one, otherwise a new one for a stage'
+        if shared_executor is not None:
+            return nullcontext(shared_executor)
+        return stage_executor(self.config, threads_per_task, initializer, initargs)
+
+    def optimize_unique(self, shared_executor=None, shared_dft_executor=None):
+        'run all stages, returning the ids of the conformers that passed the uniqueness filter'
+        with self.stage_executor(
+            shared_executor,
+            self.config.xtb_cpus_per_opt,
+            initializer=init_xtb_worker,
+            initargs=(XTB_PARAMETERS['method'],),
+        ) as executor:
+            if self.config.streaming:
+                with self.profiler.stage('streaming'):
+                    unique_ids = self.optimize_streaming(executor)
+            else:
+                unique_ids = self.optimize_staged(executor)
+
+        xtb_steps = self.ensemble.steps[unique_ids, XTB] if unique_ids else []
+        if len(xtb_steps):
+            logging.debug(f'xTB optimizations took {xtb_steps.mean():.1f} steps on average, '
+                          f'{xtb_steps.max()} at most')
         if self.config.ase_calculator is None:
-            return [conformer.stages[XTB] for conformer in self.conformers if XTB in conformer.stages]
-            
-        with ProcessPoolExecutor(max_workers=self.config.num_cpus//self.config.dft_cpus_per_opt) as executor:
+            return unique_ids
+
+        # conformers with the lowest xTB energy are optimized first
+        with self.profiler.stage('select_dft_conformers'):
+            selected_ids = self.select_dft_conformers(unique_ids)
+        dft_ids = [i for i in selected_ids
+                   if not self.ensemble.completed[i, DFT] and not self.ensemble.failed[i].any()
+                   and not self.ensemble.pruned[i, DFT]]
+        if self.config.dft_abort_window is not None and not self.resumed:
+            # energies published by the DFT optimizations of a previous run
+            BestEnergyBoard(Path(self.config.output_dir, DFT_ENERGY_BOARD)).clear()
+        with self.profiler.stage(NAMES[DFT]), \
+                self.stage_executor(shared_dft_executor, self.config.dft_cpus_per_opt) as executor:
             # run dft calculator on conformers in parallel
-            unique_conformers = list(executor.map(dft_optimize,
-                                                  range(len(unique_conformers)),
-                                                  unique_conformers,
-                                                  repeat(self.config)))
-            
-            unique_conformers = [complex for complex in unique_conformers if complex is not None]
-            
-            # update conformer list since parallel processes modified copied conformer objects
-            for i, conformer in zip(unique_ids, unique_conformers):
-                self.conformers[i] = conformer
-            
-            # order conformers with the most relevant first and write to output file
+            results = self.profiler.map(executor, NAMES[DFT], dft_ids, dft_optimize,
+                                        dft_ids,
+                                        [self.ensemble.molecule(i, XTB) for i in dft_ids],
+                                        [self.config] * len(dft_ids))
+            for i, result in zip(dft_ids, results):
+                self.set_stage(i, DFT, result)
+        if self.config.dft_abort_window is not None:
+            logging.debug(f'{self.ensemble.pruned[:, DFT].sum()} DFT optimizations stopped early '
+                          f'for leaving the energy window')
+
+        # order conformers with the most relevant first
+        with self.profiler.stage('order_conformers'):
             self.order_conformers()
-            self.write()
-            
-        return [conformer.stages[DFT] for conformer in self.conformers if DFT in conformer.stages]
-    
+        return unique_ids
+
     def write(self):
-        for i, name in NAMES.items():
-            complexes = [conformer.stages[i] for conformer in self.conformers if i in conformer.stages]
-            energies = [conformer.energies[i] if i in conformer.energies else None
-                        for conformer in self.conformers]
-            with open(f'conformers_{i}_{name}.xyz', 'w') as file:
-                for i, (stk_mol, energy) in enumerate(zip(complexes, energies)):
-                    rdkit_mol = stk_mol.to_rdkit_mol()
-                    if energy is not None:
-                        rdkit_mol.SetProp('_Name', str(energy))
-                    file.write(MolToXYZBlock(rdkit_mol))
+        if self.ensemble is None:
+            return
+        for stage in NAMES:
+            completed = self.ensemble.completed[:, stage]
+            energies = self.ensemble.energies[completed, stage]
+            self.writer.compact(stage,
+                                self.ensemble.positions[completed, stage],
+                                [None if np.isnan(energy) else energy for energy in energies])
 
 
 def load_stk_mol(molecule_path, fmt='xyz'):
@@ -217,58 +550,122 @@ def bind_ligands(
 
 def stk_list_to_xyz_file(stk_mol_list, file_path):
     with open(file_path, 'w') as file:
-        for i, stk_mol in enumerate(stk_mol_list):
-            rdkit_mol = stk_mol.to_rdkit_mol()
-            file.write(MolToXYZBlock(rdkit_mol))
+        for stk_mol in stk_mol_list:
+            file.write(xyz_block(stk_mol_symbols(stk_mol), stk_mol.get_position_matrix()))
 
 def xtb_optimize(complex):
-    return ASE(calculator.XTB()).optimize(complex)
+    'optimize with xTB, returning an OptimizationResult with the energy of the optimized geometry'
+    return ASE(
+        counting_calculator(xtb_calculator(XTB_PARAMETERS['method'])), fmax=XTB_PARAMETERS['fmax']
+    ).optimize_with_energy(complex)
 
-def xtb_energy(complex):
-    return calculator.XTB().get_potential_energy(stk_mol_to_ase_atoms(complex))
+def dft_parameters(config: Config) -> dict:
+    'settings of the DFT stage that determine its results'
+    return {
+        'calculator': type(config.ase_calculator).__name__,
+        **config.ase_calculator.parameters,
+        'max_dft_opt_steps': config.max_dft_opt_steps,
+        'dft_optimizer': config.dft_optimizer,
+        'dft_xtb_hessian': config.dft_xtb_hessian,
+    }
+
+def dft_optimize(idx, stk_mol: stk.Molecule, config: Config):
+    '''Optimize an xTB optimized conformer with the DFT calculator
+
+    Returns an OptimizationResult, Pruned if the optimization was stopped for leaving the energy
+    window of config.dft_abort_window, or None if it failed.
+    '''
+    board = None
+    if config.dft_abort_window is not None:
+        board = BestEnergyBoard(Path(config.output_dir, DFT_ENERGY_BOARD))
+    if config.cache_path is not None:
+        cache = StageCache(config.cache_path, config.cache_max_bytes)
+        key = cache.key(stk_mol, NAMES[DFT], dft_parameters(config))
+        with span('cache_lookup'):
+            entry = cache.get(key)
+        if entry is not None:
+            if board is not None:
+                board.publish(str(idx), entry.energy)
+            return OptimizationResult(stk_mol.with_position_matrix(entry.positions), *entry[1:])
     
-def dft_optimize(idx, sequence: ConformerOptimizationSequence, config: Config) -> ConformerOptimizationSequence:
-    if XTB in sequence.stages:
-        stk_mol = sequence.stages[XTB]
-        ase_mol = stk_mol_to_ase_atoms(stk_mol)
-        calc = deepcopy(config.ase_calculator)
-        calc.set_label(f'scratch/dft_optimize_{idx}/ase_generated')
-        ase_mol.calc = calc
-        
-        trajectory_file = Path('scratch', f'dft_optimize_{idx}', 'ase.traj')
-        trajectory_file.parent.mkdir(parents=True, exist_ok=True)
-        opt = BFGS(ase_mol, trajectory=str(trajectory_file))
+    ase_mol = stk_mol_to_ase_atoms(stk_mol)
+    calc = deepcopy(config.ase_calculator)
+    scratch_dir = Path(config.output_dir, 'scratch', f'dft_optimize_{idx}')
+    calc.set_label(str(scratch_dir / 'ase_generated'))
+    ase_mol.calc = counting_calculator(calc)
+    
+    scratch_dir.mkdir(parents=True, exist_ok=True)
+    hessian = None
+    # only computed for the optimizers that use it
+    if config.dft_xtb_hessian and config.dft_optimizer in HESSIAN_OPTIMIZERS:
         try:
+            with span('xtb_hessian'):
+                hessian = positive_definite(
+                    finite_difference_hessian(ase_mol, counting_calculator(
+                        xtb_calculator(XTB_PARAMETERS['method']), tag='xtb_hessian')))
+        except Exception:
+            logging.warning(f'xTB Hessian of conformer {idx} failed, starting DFT without it')
+    opt = make_optimizer(config.dft_optimizer, ase_mol, hessian=hessian)
+    recorder = None
+    if config.save_dft_trajectories:
+        recorder = TrajectoryRecorder(ase_mol)
+        opt.attach(recorder)
+    if board is not None:
+        observer = EnergyWindowObserver(ase_mol, board, str(idx), config.dft_abort_window,
+                                        config.dft_abort_patience)
+        opt.attach(observer)
+    try:
+        with span('optimization'):
             opt.run(steps=config.max_dft_opt_steps)
-            trajectory = Trajectory(trajectory_file)
-            stk_trajectory = [stk_mol.with_position_matrix(atoms.get_positions()) for atoms in trajectory]
-            sequence.stages[DFT] = stk_trajectory[-1]
-            sequence.energies[DFT] = trajectory[-1].get_potential_energy()
-            return sequence
-        except:
-            return None
-    else:
+        # cached results of the last step, fmax shows whether it converged within max_dft_opt_steps
+        energy = ase_mol.get_potential_energy()
+        fmax = max_force(ase_mol.get_forces())
+        dft_mol = stk_mol.with_position_matrix(ase_mol.get_positions())
+        if config.cache_path is not None:
+            with span('cache_store'):
+                cache.put(key, dft_mol.get_position_matrix(), energy, opt.nsteps, fmax)
+        return OptimizationResult(dft_mol, energy, opt.nsteps, fmax)
+    except EnergyWindowExceeded:
+        return Pruned(observer.lowest, opt.nsteps)
+    except:
         return None
+    finally:
+        if recorder is not None:
+            recorder.save(scratch_dir / 'trajectory.npz')
     
-def reperceive_bonds(stk_mol):
-    # output to xyz and read in with pybel to reperceive bonding
-    pybel_mol = stk_mol_to_pybel_mol(stk_mol, reperceive_bonds=True)
-    return pybel_mol_to_stk_mol(pybel_mol)
-
-def num_connectivity_differences(stk_mol_1, stk_mol_2):
-    def bond_tuple(bond):
-        return(tuple(sorted((bond.get_atom1().get_id(),  bond.get_atom2().get_id()))))
-        
-    bond_tuples_1 = {bond_tuple(bond) for bond in stk_mol_1.get_bonds()}
-    bond_tuples_2 = {bond_tuple(bond) for bond in stk_mol_2.get_bonds()}
-    # return the number of bonds that appear in one of the molecules but not both
-    return len(bond_tuples_1 ^ bond_tuples_2)
+def openbabel_parameters(config: Config) -> dict:
+    'settings of the openbabel conformer search that determine its results'
+    return {
+        'initial_conformers': config.initial_conformers,
+        'num_children': config.ob_num_children,
+        'mutability': config.ob_mutability,
+        'convergence': config.ob_convergence,
+    }
 
 def gen_confs_openbabel(stk_mol, config) -> list:
+    if config.cache_path is not None:
+        cache = LigandConformerCache(StageCache(config.cache_path, config.cache_max_bytes))
+        stk_conformers = cache.get(stk_mol, openbabel_parameters(config))
+        if stk_conformers is not None:
+            return stk_conformers
+    stk_conformers = search_confs_openbabel(stk_mol, config)
+    if config.cache_path is not None:
+        cache.put(stk_mol, openbabel_parameters(config), stk_conformers)
+    return stk_conformers
+
+def gen_confs_openbabel_concurrently(stk_mols, config, executor=None) -> list:
+    'gen_confs_openbabel for several ligands at once, each searched in its own task of the executor'
+    if executor is not None:
+        return list(executor.map(gen_confs_openbabel, stk_mols, [config] * len(stk_mols)))
+    with stage_executor(config) as executor:
+        return list(executor.map(gen_confs_openbabel, stk_mols, [config] * len(stk_mols)))
+
+def search_confs_openbabel(stk_mol, config) -> list:
     pybel_mol = stk_mol_to_pybel_mol(stk_mol)
     cs = pb.ob.OBConformerSearch()
     # Setup arguments: OBMol, numConformers, numChildren, mutability, convergence
-    cs.Setup(pybel_mol.OBMol, config.initial_conformers, 5, 5, 5) 
+    cs.Setup(pybel_mol.OBMol, config.initial_conformers, config.ob_num_children, config.ob_mutability,
+             config.ob_convergence)
     cs.Search()
     cs.GetConformers(pybel_mol.OBMol)
     
@@ -280,9 +677,39 @@ def gen_confs_openbabel(stk_mol, config) -> list:
     return [stk_mol.with_position_matrix(stk_conformer.get_position_matrix())
             for stk_conformer in stk_conformers]
     
-def gen_ligand_library_entry(stk_ligand, config):
-    stk_conformers = gen_confs_openbabel(stk_ligand, config)
-    stk_list_to_xyz_file(stk_conformers, 'conformers_ligand_only.xyz')
-    unoptimized_complexes = [bind_to_dimethyl_Pd(ligand) for ligand in stk_conformers]
-    ConformerEnsembleOptimizer(unoptimized_complexes, config).optimize()
+def gen_ligand_library_entry(stk_ligand, config, name=None, executor=None, dft_executor=None):
+    '''Generate and optimize the conformers of a ligand bound to dimethyl palladium
+
+    The conformers are written to xyz files in config.output_dir and, if config.library_path is
+    set, added to the ligand library under name, by default the name of the output directory.
+    The conformer search and the stages up to xTB run on executor and the DFT stage on
+    dft_executor, if they are given.
+    '''
+    ligand_conformers_path = Path(config.output_dir, 'conformers_ligand_only.xyz')
+    resume = (config.checkpoint_path is not None and Path(config.checkpoint_path).exists()
+              and ligand_conformers_path.exists())
+    if resume:
+        # reuse the ligand conformers of the interrupted job so the complexes are regenerated identically
+        stk_conformers = [stk_ligand.with_position_matrix(conformer.get_position_matrix())
+                          for conformer in load_stk_mol_list(ligand_conformers_path)]
+    else:
+        if executor is None:
+            stk_conformers = gen_confs_openbabel(stk_ligand, config)
+        else:
+            stk_conformers = executor.submit(gen_confs_openbabel, stk_ligand, config).result()
+        stk_list_to_xyz_file(stk_conformers, ligand_conformers_path)
+    unoptimized_complexes = (bind_to_dimethyl_Pd(ligand) for ligand in stk_conformers)
+    if resume:
+        optimizer = ConformerEnsembleOptimizer.resume(config, unoptimized_complexes)
+    else:
+        optimizer = ConformerEnsembleOptimizer(unoptimized_complexes, config)
+    optimizer.optimize(executor, dft_executor)
+    if config.library_path is not None and optimizer.ensemble is not None:
+        with LigandLibrary(config.library_path) as library:
+            library.add_ensemble(
+                Path(config.output_dir).resolve().name if name is None else name,
+                optimizer.ensemble,
+                smiles=canonical_smiles(stk_ligand),
+                metadata={'stages': NAMES, 'version': version('py-conformational-sampling')},
+            )
     logging.debug('Finished generating ligand library entry')
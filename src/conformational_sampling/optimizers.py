@@ -0,0 +1,73 @@
+import numpy as np
+from ase.optimize import BFGS, FIRE, BFGSLineSearch
+from ase.optimize.precon import PreconLBFGS
+
+# eigenvalues (eV/Å^2) of initial Hessians are raised to at least this, so the translations,
+# rotations and soft or negative curvature modes do not give huge or uphill first steps
+MIN_HESSIAN_EIGENVALUE = 5.0
+
+
+class WarmBFGSLineSearch(BFGSLineSearch):
+    'BFGSLineSearch starting from a given Hessian instead of the identity'
+    def __init__(self, atoms, hessian, **kwargs) -> None:
+        super().__init__(atoms, **kwargs)
+        # BFGSLineSearch keeps the inverse Hessian of the gradient scaled by 1 / alpha
+        self.H0 = self.alpha * np.linalg.inv(hessian)
+
+    def update(self, r, g, r0, g0, p0):
+        if self.H is None:
+            self.I = np.eye(len(self.atoms) * 3, dtype=int)
+            self.H = self.H0.copy()
+            return
+        super().update(r, g, r0, g0, p0)
+
+
+OPTIMIZERS = {
+    'BFGS': BFGS,
+    'BFGSLineSearch': BFGSLineSearch,
+    'FIRE': FIRE,
+    'PreconLBFGS': PreconLBFGS,
+}
+# optimizers that start from an initial Hessian, the others ignore it
+HESSIAN_OPTIMIZERS = {'BFGS', 'BFGSLineSearch'}
+
+
+def finite_difference_hessian(atoms, calculator, delta: float = 0.005):
+    'Hessian (eV/Å^2) of the atoms from central differences of the forces of the calculator'
+    atoms = atoms.copy()
+    atoms.calc = calculator
+    positions = atoms.get_positions().reshape(-1)
+    hessian = np.empty((len(positions), len(positions)))
+    for k in range(len(positions)):
+        forces = []
+        for displacement in (delta, -delta):
+            displaced = positions.copy()
+            displaced[k] += displacement
+            atoms.set_positions(displaced.reshape(-1, 3))
+            forces.append(atoms.get_forces().reshape(-1))
+        hessian[k] = (forces[1] - forces[0]) / (2 * delta)
+    return (hessian + hessian.T) / 2
+
+
+def positive_definite(hessian, min_eigenvalue: float = MIN_HESSIAN_EIGENVALUE):
+    'the Hessian with the absolute values of its eigenvalues, raised to at least min_eigenvalue'
+    eigenvalues, eigenvectors = np.linalg.eigh(hessian)
+    eigenvalues = np.maximum(np.abs(eigenvalues), min_eigenvalue)
+    return (eigenvectors * eigenvalues) @ eigenvectors.T
+
+
+def make_optimizer(name: str, atoms, trajectory=None, hessian=None, logfile='-'):
+    '''Set up the ASE optimizer called name for the atoms
+
+    The HESSIAN_OPTIMIZERS start from the given initial Hessian if there is one. FIRE and
+    PreconLBFGS do not use a Hessian, so it is ignored for them.
+    '''
+    if name not in OPTIMIZERS:
+        raise ValueError(f'unknown optimizer {name!r}, expected one of {list(OPTIMIZERS)}')
+    if hessian is not None and name == 'BFGS':
+        optimizer = BFGS(atoms, trajectory=trajectory, logfile=logfile)
+        optimizer.H0 = hessian
+        return optimizer
+    if hessian is not None and name == 'BFGSLineSearch':
+        return WarmBFGSLineSearch(atoms, hessian, trajectory=trajectory, logfile=logfile)
+    return OPTIMIZERS[name](atoms, trajectory=trajectory, logfile=logfile)
@@ -0,0 +1,40 @@
+import os
+from pathlib import Path
+
+from conformational_sampling.utils import xyz_block
+
+
+class ConformerWriter:
+    '''Appends conformers to one xyz file per stage as soon as they complete a stage
+
+    The files can be followed while a job runs and are written in completion order. They are kept
+    open in append mode so each conformer costs one small write instead of a rewrite of the file.
+    Calling compact() rewrites a file with the conformers in their final order.
+    '''
+    def __init__(self, file_names: dict, symbols: list, append: bool = False) -> None:
+        self.paths = {stage: Path(file_name) for stage, file_name in file_names.items()}
+        # element symbols of the atoms, shared by all conformers
+        self.symbols = symbols
+        self.files = {stage: open(path, 'a' if append else 'w') for stage, path in self.paths.items()}
+
+    def _xyz_block(self, positions, energy) -> str:
+        return xyz_block(self.symbols, positions, '' if energy is None else str(energy))
+
+    def append(self, stage, positions, energy=None) -> None:
+        file = self.files[stage]
+        file.write(self._xyz_block(positions, energy))
+        file.flush()
+
+    def compact(self, stage, positions, energies) -> None:
+        'replace the file of a stage with the given conformers, in order'
+        self.files[stage].close()
+        temporary_path = self.paths[stage].with_suffix('.xyz.tmp')
+        with open(temporary_path, 'w') as file:
+            file.writelines(self._xyz_block(conformer_positions, energy)
+                            for conformer_positions, energy in zip(positions, energies))
+        os.replace(temporary_path, self.paths[stage])
+        self.files[stage] = open(self.paths[stage], 'a')
+
+    def close(self) -> None:
+        for file in self.files.values():
+            file.close()
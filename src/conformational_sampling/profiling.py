@@ -0,0 +1,257 @@
+import json
+import os
+import resource
+import socket
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, NamedTuple
+
+import numpy as np
+
+from conformational_sampling.accounting import call_totals, counted_calls
+
+# spans of the task running in this context, None outside of a profiled task
+_task_spans = ContextVar('task_spans', default=None)
+
+
+class TaskStats(NamedTuple):
+    'measured by the worker running a task, times are seconds since the epoch'
+    host: str
+    pid: int
+    thread: int
+    start: float
+    end: float
+    # CPU time of the whole worker process during the task, including its OpenMP threads
+    cpu: float
+    # high-water marks (MB) of the worker process and of its finished child processes so far
+    peak_rss: float
+    peak_child_rss: float
+    # (name, start, end) of the spans within the task
+    spans: tuple
+    # call_totals of the calculators wrapped with counting_calculator during the task
+    calculator_calls: dict
+
+
+def peak_rss(who=resource.RUSAGE_SELF) -> float:
+    'peak resident set size (MB) of this process, or of its finished children'
+    # kilobytes on Linux
+    return resource.getrusage(who).ru_maxrss / 1024
+
+
+@contextmanager
+def span(name: str):
+    'time a part of a profiled task, shown nested in the task in the trace (no-op outside of one)'
+    spans = _task_spans.get()
+    if spans is None:
+        yield
+        return
+    start = time.time()
+    try:
+        yield
+    finally:
+        spans.append((name, start, time.time()))
+
+
+@dataclass(frozen=True)
+class ProfiledCall:
+    'picklable wrapper of a task function returning its result along with the TaskStats of the call'
+    function: Callable
+
+    def __call__(self, *args):
+        spans = []
+        token = _task_spans.set(spans)
+        start, start_cpu = time.time(), time.process_time()
+        try:
+            with counted_calls() as calls:
+                result = self.function(*args)
+        finally:
+            _task_spans.reset(token)
+        stats = TaskStats(socket.gethostname(), os.getpid(), threading.get_ident(), start, time.time(),
+                          time.process_time() - start_cpu, peak_rss(), peak_rss(resource.RUSAGE_CHILDREN),
+                          tuple(spans), call_totals(calls))
+        return result, stats
+
+
+def merge_call_totals(totals: list) -> dict:
+    'add up call_totals, keeping the totals by tag'
+    merged = {'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'repeated': 0, 'by_tag': {}}
+    for total in totals:
+        for tag, tag_total in [(None, total)] + list(total['by_tag'].items()):
+            target = merged if tag is None else merged['by_tag'].setdefault(
+                tag, {'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'repeated': 0})
+            target['calls'] += tag_total['calls']
+            target['seconds'] += tag_total['seconds']
+            target['max_seconds'] = max(target['max_seconds'], tag_total['max_seconds'])
+            target['repeated'] += tag_total['repeated']
+    return merged
+
+
+class Profiler:
+    '''Records the stages run by this process and the tasks they submit to executors
+
+    Stages are timed here with stage(), and tasks submitted through submit() or map() are timed
+    by the worker running them. Each task records its wall and CPU time, worker, queue wait (from
+    submission to the start on the worker) and peak RSS of the worker, along with the spans
+    marked with span() inside of it and the energy/gradient calls of the calculators wrapped with
+    accounting.counting_calculator. write() exports a JSON summary by stage and a trace event
+    file that can be opened in Perfetto or chrome://tracing.
+
+    Times are taken from the system clock, so queue waits of workers on other nodes include their
+    clock offset. A disabled profiler submits tasks directly to the executor and records nothing.
+    '''
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.start = time.time()
+        self.stages = []
+        self.tasks = []
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        'time the body as a stage of this process, e.g. the whole of a stage including its barrier'
+        if not self.enabled:
+            yield
+            return
+        start, start_cpu = time.time(), time.process_time()
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.stages.append({'stage': name, 'start': start, 'end': time.time(),
+                                    'cpu': time.process_time() - start_cpu, 'peak_rss': peak_rss()})
+
+    def submit(self, executor, stage: str, conformer, function, *args) -> Future:
+        'submit function(*args) to the executor as a task of a stage and conformer'
+        if not self.enabled:
+            return executor.submit(function, *args)
+        submitted = time.time()
+        future = Future()
+
+        def record(task_future):
+            try:
+                result, stats = task_future.result()
+            except BaseException as exception:
+                self.record_task(stage, conformer, submitted, None, error=repr(exception))
+                future.set_exception(exception)
+                return
+            self.record_task(stage, conformer, submitted, stats)
+            future.set_result(result)
+
+        executor.submit(ProfiledCall(function), *args).add_done_callback(record)
+        return future
+
+    def map(self, executor, stage: str, conformers, function, *iterables):
+        'like executor.map, with the tasks of a stage labelled by conformers'
+        if not self.enabled:
+            return executor.map(function, *iterables)
+        futures = [self.submit(executor, stage, conformer, function, *args)
+                   for conformer, *args in zip(conformers, *iterables)]
+        return (future.result() for future in futures)
+
+    def record_task(self, stage: str, conformer, submitted: float, stats: TaskStats, error: str = None) -> None:
+        task = {'stage': stage, 'conformer': conformer, 'submitted': submitted,
+                'completed': time.time(), 'error': error}
+        if stats is not None:
+            task.update(stats._asdict())
+            task['spans'] = [list(task_span) for task_span in stats.spans]
+            task['queue_wait'] = stats.start - submitted
+        with self.lock:
+            self.tasks.append(task)
+
+    def summary(self) -> dict:
+        'totals and distributions of the times of each stage and its tasks'
+        stages = {}
+        for name in dict.fromkeys([stage['stage'] for stage in self.stages] + [task['stage'] for task in self.tasks]):
+            spans = [stage for stage in self.stages if stage['stage'] == name]
+            tasks = [task for task in self.tasks if task['stage'] == name]
+            timed = [task for task in tasks if 'start' in task]
+            summary = {
+                'wall': sum(stage['end'] - stage['start'] for stage in spans),
+                'cpu': sum(stage['cpu'] for stage in spans),
+                'tasks': len(tasks),
+                'failed_tasks': sum(task['error'] is not None for task in tasks),
+            }
+            if timed:
+                wall = np.array([task['end'] - task['start'] for task in timed])
+                queue_wait = np.array([task['queue_wait'] for task in timed])
+                workers = {(task['host'], task['pid'], task['thread']) for task in timed}
+                summary.update({
+                    'task_wall': wall.sum(),
+                    'task_cpu': sum(task['cpu'] for task in timed),
+                    'task_wall_median': np.median(wall),
+                    'task_wall_max': wall.max(),
+                    # how much longer the slowest task took than a typical one
+                    'straggler_ratio': wall.max() / np.median(wall) if np.median(wall) > 0 else None,
+                    'queue_wait_mean': queue_wait.mean(),
+                    'queue_wait_max': queue_wait.max(),
+                    'peak_rss': max(task['peak_rss'] for task in timed),
+                    'peak_child_rss': max(task['peak_child_rss'] for task in timed),
+                    'workers': len(workers),
+                    'calculator_calls': merge_call_totals([task['calculator_calls'] for task in timed]),
+                })
+                if summary['wall'] > 0:
+                    # fraction of the stage the workers spent running its tasks, the rest is idle
+                    # time such as waiting at the barrier for the last tasks
+                    summary['utilization'] = wall.sum() / (summary['wall'] * len(workers))
+            stages[name] = {key: float(value) if isinstance(value, np.floating) else value
+                            for key, value in summary.items()}
+        conformers = {}
+        for task in self.tasks:
+            if 'calculator_calls' in task and task['calculator_calls']['calls']:
+                conformers.setdefault(str(task['conformer']), {})[task['stage']] = task['calculator_calls']
+        return {
+            'start': self.start,
+            'wall': max([stage['end'] for stage in self.stages] + [task['completed'] for task in self.tasks],
+                        default=self.start) - self.start,
+            'peak_rss': peak_rss(),
+            'stages': stages,
+            # calculator calls of each conformer by stage
+            'conformers': conformers,
+            'tasks': self.tasks,
+        }
+
+    def trace_events(self) -> list:
+        'Chrome trace events of the stages and tasks, with one track per process and thread'
+        def microseconds(seconds):
+            return (seconds - self.start) * 1e6
+
+        coordinator = (socket.gethostname(), os.getpid())
+        # trace pids are numbered, as workers on different hosts can have the same pid
+        processes = {coordinator: 0}
+        for task in self.tasks:
+            if 'pid' in task:
+                processes.setdefault((task['host'], task['pid']), len(processes))
+        events = [{'name': 'process_name', 'ph': 'M', 'pid': number,
+                   'args': {'name': f'{"coordinator" if number == 0 else "worker"} {pid} on {host}'}}
+                  for (host, pid), number in processes.items()]
+        events += [{'name': stage['stage'], 'cat': 'stage', 'ph': 'X', 'pid': 0, 'tid': 0,
+                    'ts': microseconds(stage['start']), 'dur': (stage['end'] - stage['start']) * 1e6,
+                    'args': {'cpu': stage['cpu']}} for stage in self.stages]
+        for task in self.tasks:
+            if 'pid' not in task:
+                continue
+            pid = processes[task['host'], task['pid']]
+            events.append({
+                'name': f'{task["stage"]} {task["conformer"]}', 'cat': task['stage'], 'ph': 'X',
+                'pid': pid, 'tid': task['thread'],
+                'ts': microseconds(task['start']), 'dur': (task['end'] - task['start']) * 1e6,
+                'args': {'conformer': task['conformer'], 'queue_wait': task['queue_wait'], 'cpu': task['cpu'],
+                         'peak_rss': task['peak_rss'], 'error': task['error'],
+                         'calculator_calls': task['calculator_calls']['calls']},
+            })
+            events += [{'name': name, 'cat': task['stage'], 'ph': 'X', 'pid': pid, 'tid': task['thread'],
+                        'ts': microseconds(start), 'dur': (end - start) * 1e6} for name, start, end in task['spans']]
+        return events
+
+    def write(self, directory: Path, prefix: str = 'profile') -> None:
+        'write {prefix}_summary.json and the trace events to {prefix}_trace.json in the directory'
+        if not self.enabled:
+            return
+        with self.lock:
+            Path(directory, f'{prefix}_summary.json').write_text(json.dumps(self.summary(), indent=2))
+            Path(directory, f'{prefix}_trace.json').write_text(json.dumps({'traceEvents': self.trace_events()}))
@@ -0,0 +1,164 @@
+from collections import defaultdict
+from itertools import product
+
+import numpy as np
+import stk
+from rdkit import Chem
+
+# bounds the size of the (references x symmetries x atoms x 3) difference arrays
+MAX_BATCH_ELEMENTS = 2**24
+
+# terminal O/N atoms sharing a neighbour, e.g. nitro and carboxylate oxygens
+_CONJUGATED_TERMINAL_ATOMS = Chem.MolFromSmarts('[O,N;D1]~[*]~[O,N;D1]')
+
+
+def heavy_atom_symmetries(stk_mol: stk.Molecule, max_matches: int = 1000000):
+    '''Return the ids of the heavy atoms of an stk molecule and their symmetry equivalent orderings
+
+    Matches the heavy atom graph onto itself the same way as rdkit's CalcRMS: chirality is
+    ignored and conjugated terminal groups (like nitro and carboxylate) are treated symmetrically.
+    Each row of the returned permutation array reorders the heavy atoms onto an equivalent atom.
+    '''
+    rdkit_mol = stk_mol.to_rdkit_mol()
+    for atom in rdkit_mol.GetAtoms():
+        atom.SetIntProp('stk_id', atom.GetIdx())
+    heavy_mol = Chem.RWMol(Chem.RemoveHs(rdkit_mol))
+    heavy_ids = np.array([atom.GetIntProp('stk_id') for atom in heavy_mol.GetAtoms()])
+
+    for match in heavy_mol.GetSubstructMatches(_CONJUGATED_TERMINAL_ATOMS):
+        for terminal_id in match[0], match[2]:
+            heavy_mol.GetAtomWithIdx(terminal_id).SetFormalCharge(0)
+            heavy_mol.GetBondBetweenAtoms(terminal_id, match[1]).SetBondType(Chem.BondType.ONEANDAHALF)
+
+    permutations = heavy_mol.GetSubstructMatches(
+        heavy_mol, uniquify=False, useChirality=False, maxMatches=max_matches
+    )
+    return heavy_ids, np.array(permutations, dtype=int)
+
+
+def rms(probe, references, permutations, align=False):
+    '''Symmetry aware RMS between a probe and a batch of reference conformers
+
+    probe has shape (n, 3), references has shape (m, n, 3) and permutations has shape (p, n).
+    Without alignment the RMS is computed in place like rdkit's CalcRMS, with alignment the
+    optimal rotation (Kabsch) is applied for every symmetry equivalent atom ordering.
+    Returns the lowest RMS over all orderings for each reference, with shape (m,).
+    '''
+    num_references, num_atoms, _ = references.shape
+    if align:
+        probe = probe - probe.mean(axis=0)
+        references = references - references.mean(axis=1, keepdims=True)
+        probe_norm = (probe**2).sum()
+        reference_norms = (references**2).sum(axis=(1, 2))
+
+    best = np.full(num_references, np.inf)
+    chunk_size = max(1, MAX_BATCH_ELEMENTS // (num_references * num_atoms * 3))
+    for start in range(0, len(permutations), chunk_size):
+        permuted = references[:, permutations[start:start + chunk_size]]
+        if align:
+            # sum of the singular values of the correlation matrix, with a reflection correction
+            correlation = np.einsum('ij,mpik->mpjk', probe, permuted)
+            singular_values = np.linalg.svd(correlation, compute_uv=False)
+            singular_values[..., -1] *= np.sign(np.linalg.det(correlation))
+            squared = probe_norm + reference_norms[:, None] - 2 * singular_values.sum(axis=-1)
+        else:
+            squared = ((permuted - probe)**2).sum(axis=(2, 3))
+        best = np.minimum(best, squared.min(axis=1))
+    return np.sqrt(np.maximum(best, 0) / num_atoms)
+
+
+def principal_radii(positions):
+    '''Shape descriptor of a conformer that is invariant to rotation, translation and atom order
+
+    The singular values of the centered coordinates divided by sqrt(n), i.e. the square roots of
+    the principal moments of the gyration tensor. By Mirsky's inequality the euclidean distance
+    between the principal radii of two conformers is a lower bound on their RMS, aligned or not.
+    '''
+    centered = positions - positions.mean(axis=0)
+    return np.linalg.svd(centered, compute_uv=False) / np.sqrt(len(positions))
+
+
+class ShapeIndex:
+    '''Buckets conformers by principal radii to find the candidates for an RMS comparison
+
+    Conformers within the threshold RMS of each other always fall in the same or neighbouring
+    buckets, so only those need their descriptors compared and only conformers whose descriptor
+    distance is below the threshold need an RMS calculation. The index only stores descriptors,
+    so it can be used for the conformers of any stage.
+    '''
+    def __init__(self, threshold: float) -> None:
+        self.threshold = threshold
+        self.buckets = defaultdict(list)
+        self.descriptors = []
+
+    def _bucket(self, descriptor):
+        return tuple(np.floor(descriptor / self.threshold).astype(int))
+
+    def add(self, descriptor) -> int:
+        'index a descriptor, returning its id'
+        self.buckets[self._bucket(descriptor)].append(len(self.descriptors))
+        self.descriptors.append(descriptor)
+        return len(self.descriptors) - 1
+
+    def candidates(self, descriptor):
+        'ids of indexed conformers that may be within the threshold RMS of the descriptor'
+        bucket = self._bucket(descriptor)
+        ids = [i for offset in product((-1, 0, 1), repeat=len(bucket))
+               for i in self.buckets.get(tuple(np.add(bucket, offset)), ())]
+        if not ids:
+            return np.array(ids, dtype=int)
+        ids = np.array(ids)
+        lower_bounds = np.linalg.norm(np.array([self.descriptors[i] for i in ids]) - descriptor, axis=1)
+        return ids[lower_bounds < self.threshold]
+
+
+class UniqueConformerFilter:
+    '''Greedily accepts conformers that are at least a threshold RMS from all accepted conformers
+
+    All conformers must share the molecular graph of the stk molecule the filter is built from.
+    Heavy atom positions are extracted once per conformer. A shape index rules out most accepted
+    conformers without any RMS calculation, and the remaining candidates are compared in a single
+    batched numpy calculation.
+    '''
+    def __init__(self, stk_mol: stk.Molecule, threshold: float, align: bool = False) -> None:
+        self.heavy_ids, self.permutations = heavy_atom_symmetries(stk_mol)
+        self.threshold = threshold
+        self.align = align
+        self.shape_index = ShapeIndex(threshold)
+        self.num_unique = 0
+        self._unique_positions = np.empty((16, len(self.heavy_ids), 3))
+
+    @property
+    def unique_positions(self):
+        return self._unique_positions[:self.num_unique]
+
+    def add(self, stk_mol: stk.Molecule) -> bool:
+        'accept the conformer if it is unique, returning whether it was accepted'
+        positions = stk_mol.get_position_matrix()[self.heavy_ids]
+        if self.threshold <= 0: # every conformer is unique
+            return True
+        descriptor = principal_radii(positions)
+        candidates = self.shape_index.candidates(descriptor)
+        if len(candidates) and np.any(
+            rms(positions, self.unique_positions[candidates], self.permutations, self.align)
+            < self.threshold
+        ):
+            return False
+        self._accept(positions, descriptor)
+        return True
+
+    def accept(self, stk_mol: stk.Molecule) -> None:
+        'accept a conformer without checking its uniqueness'
+        if self.threshold <= 0:
+            return
+        positions = stk_mol.get_position_matrix()[self.heavy_ids]
+        self._accept(positions, principal_radii(positions))
+
+    def _accept(self, positions, descriptor) -> None:
+        if self.num_unique == len(self._unique_positions):
+            self._unique_positions = np.concatenate(
+                [self._unique_positions, np.empty_like(self._unique_positions)]
+            )
+        self._unique_positions[self.num_unique] = positions
+        self.num_unique += 1
+        self.shape_index.add(descriptor)
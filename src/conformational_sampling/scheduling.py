@@ -0,0 +1,104 @@
+import ctypes
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from multiprocessing import get_context
+from pathlib import Path
+
+# read by OpenMP, MKL and OpenBLAS, including in external programs like DFT codes started by a task
+THREAD_VARIABLES = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS')
+
+# threading libraries that may already be loaded (e.g. xtb's libgomp) and their thread setters
+THREAD_LIBRARIES = {
+    'gomp': 'omp_set_num_threads',
+    'iomp': 'omp_set_num_threads',
+    'libomp': 'omp_set_num_threads',
+    'mkl_rt': 'mkl_set_num_threads',
+    'openblas': 'openblas_set_num_threads',
+}
+
+
+@dataclass(frozen=True)
+class StageShape:
+    'number of worker processes of a stage and the threads (cores) each worker uses'
+    processes: int
+    threads: int
+
+
+def available_cpus() -> list:
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count()))
+
+
+def limit_threads(threads: int) -> None:
+    'limit this process and the programs it starts to the given number of threads'
+    for variable in THREAD_VARIABLES:
+        os.environ[variable] = str(threads)
+    # threading libraries read the environment variables when loaded, so set loaded ones directly
+    try:
+        with open('/proc/self/maps') as maps:
+            libraries = {line.split()[-1] for line in maps if '.so' in line}
+    except OSError: # not linux
+        return
+    for library in libraries:
+        for name, setter in THREAD_LIBRARIES.items():
+            if name in Path(library).name:
+                try:
+                    getattr(ctypes.CDLL(library), setter)(ctypes.c_int(threads))
+                except (OSError, AttributeError):
+                    pass
+
+
+def init_worker(cpu_sets, threads: int, initializer=None, initargs=()) -> None:
+    'process pool initializer that claims a set of cores for the worker before any other setup'
+    limit_threads(threads)
+    cpus = cpu_sets.get()
+    if cpus is not None:
+        os.sched_setaffinity(0, cpus)
+    if initializer is not None:
+        initializer(*initargs)
+
+
+class CoreBudget:
+    '''Divides the cores given to a job between the workers of each stage
+
+    A stage with threads per task gets num_cpus // threads worker processes, each limited to its
+    threads through the usual environment variables and the already loaded threading libraries.
+    When the job can use at least num_cpus cores, every worker is also pinned to its own cores,
+    so the workers of a stage never oversubscribe the node. Stages running at the same time get
+    disjoint cores from split().
+    '''
+    def __init__(self, num_cpus: int, cpus: list = None) -> None:
+        self.num_cpus = num_cpus
+        self.cpus = available_cpus() if cpus is None else list(cpus)
+
+    def split(self, num_cpus: int) -> tuple:
+        'two budgets for concurrent stages, the first with num_cpus of the cores and the second the rest'
+        if self.num_cpus < 2: # nothing to split, the stages share the core
+            return self, self
+        num_cpus = max(1, min(num_cpus, self.num_cpus - 1))
+        return (CoreBudget(num_cpus, self.cpus[:num_cpus]),
+                CoreBudget(self.num_cpus - num_cpus, self.cpus[num_cpus:self.num_cpus]))
+
+    def shape(self, threads_per_task: int = 1) -> StageShape:
+        threads = max(1, min(threads_per_task, self.num_cpus))
+        return StageShape(processes=max(1, self.num_cpus // threads), threads=threads)
+
+    def executor(self, threads_per_task: int = 1, initializer=None, initargs=()) -> ProcessPoolExecutor:
+        shape = self.shape(threads_per_task)
+        context = get_context()
+        cpu_sets = context.SimpleQueue()
+        pin = hasattr(os, 'sched_setaffinity') and len(self.cpus) >= shape.processes * shape.threads
+        if not pin:
+            logging.debug(f'Not pinning workers, {len(self.cpus)} cores available for {shape}')
+        for process in range(shape.processes):
+            start = process * shape.threads
+            cpu_sets.put(self.cpus[start:start + shape.threads] if pin else None)
+        return ProcessPoolExecutor(
+            max_workers=shape.processes,
+            mp_context=context,
+            initializer=init_worker,
+            initargs=(cpu_sets, shape.threads, initializer, initargs),
+        )
@@ -0,0 +1,119 @@
+import csv
+import logging
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import ExitStack
+from dataclasses import dataclass, replace
+from pathlib import Path
+
+import stk
+
+from conformational_sampling.calculators import init_xtb_worker
+from conformational_sampling.checkpoint import sync_on_signals
+from conformational_sampling.config import Config
+from conformational_sampling.executors import stage_executor
+from conformational_sampling.scheduling import CoreBudget
+from conformational_sampling.main import XTB_PARAMETERS, gen_ligand_library_entry, load_stk_mol
+
+
+@dataclass(frozen=True)
+class ManifestEntry:
+    'a ligand to screen: its name, geometry file and the SMARTS of the atoms binding the metal'
+    name: str
+    path: Path
+    smarts: str
+    # indices of the binding atoms within the SMARTS
+    bonders: tuple = (0,)
+
+
+def read_manifest(manifest_path: Path) -> list:
+    '''Read a CSV manifest of ligands with the columns name, path, smarts and optionally bonders
+
+    Paths are relative to the manifest, bonders are space separated atom indices into the SMARTS
+    (0 by default) and the name defaults to the stem of the path.
+    '''
+    manifest_path = Path(manifest_path)
+    with open(manifest_path, newline='') as file:
+        return [
+            ManifestEntry(
+                name=row.get('name') or Path(row['path']).stem,
+                path=manifest_path.parent / row['path'],
+                smarts=row['smarts'],
+                bonders=tuple(int(bonder) for bonder in (row.get('bonders') or '0').split()),
+            )
+            for row in csv.DictReader(file)
+        ]
+
+
+def load_ligand(entry: ManifestEntry) -> stk.BuildingBlock:
+    functional_group_factory = stk.SmartsFunctionalGroupFactory(
+        smarts=entry.smarts,
+        bonders=entry.bonders,
+        deleters=(),
+    )
+    return stk.BuildingBlock.init_from_molecule(load_stk_mol(entry.path), functional_groups=[functional_group_factory])
+
+
+def screen_ligand(entry: ManifestEntry, config: Config, output_dir: Path, executor, dft_executor) -> None:
+    'run gen_ligand_library_entry for one ligand in its own output directory'
+    ligand_dir = Path(output_dir, entry.name)
+    ligand_dir.mkdir(parents=True, exist_ok=True)
+    ligand_config = replace(
+        config,
+        output_dir=ligand_dir,
+        checkpoint_path=None if config.checkpoint_path is None else ligand_dir / Path(config.checkpoint_path).name,
+    )
+    gen_ligand_library_entry(load_ligand(entry), ligand_config, name=entry.name, executor=executor,
+                             dft_executor=dft_executor)
+
+
+def screen(entries, config: Config, output_dir: Path = Path(), max_concurrent_ligands: int = 4) -> dict:
+    '''Generate the library entries of many ligands, sharing the executors between all of them
+
+    Each ligand runs gen_ligand_library_entry in its own thread, in the directory output_dir/name,
+    with up to max_concurrent_ligands ligands at a time. Their tasks all go to the same workers,
+    so the workers stay busy while a ligand is in a serial phase such as uniqueness filtering.
+    The stages up to xTB run on workers with xtb_cpus_per_opt cores each, and the DFT stage on a
+    second executor with dft_cpus_per_opt cores per worker. As both run at the same time, the
+    DFT executor gets config.screen_dft_cpus of the num_cpus cores and the other executor the
+    rest, so the node is not oversubscribed. With config.checkpoint_path set, each ligand has its own checkpoint of that
+    name in its directory, and rerunning the screen resumes the unfinished ligands. When called
+    from the main thread, the checkpoints of all running ligands are synced on SIGTERM or SIGUSR1.
+
+    Returns the exceptions of the ligands that failed by name, the others are still completed.
+    '''
+    failures = {}
+    with ExitStack() as stack:
+        if config.checkpoint_path is not None and threading.current_thread() is threading.main_thread():
+            # the ligands run in other threads, which cannot install signal handlers themselves
+            for signum, handler in sync_on_signals().items():
+                stack.callback(signal.signal, signum, handler)
+        xtb_budget, dft_budget = CoreBudget(config.num_cpus), None
+        if config.ase_calculator is not None:
+            dft_cpus = config.num_cpus // 2 if config.screen_dft_cpus is None else config.screen_dft_cpus
+            dft_budget, xtb_budget = xtb_budget.split(dft_cpus)
+        executor = stack.enter_context(stage_executor(
+            config, config.xtb_cpus_per_opt, initializer=init_xtb_worker, initargs=(XTB_PARAMETERS['method'],),
+            budget=xtb_budget,
+        ))
+        dft_executor = None
+        if dft_budget is not None:
+            dft_executor = stack.enter_context(stage_executor(config, config.dft_cpus_per_opt, budget=dft_budget))
+        # start the workers from this thread, a process pool forks them on its first task
+        for started_executor in (executor, dft_executor):
+            if started_executor is not None:
+                started_executor.submit(int).result()
+        with ThreadPoolExecutor(max_concurrent_ligands) as ligand_threads:
+            futures = {ligand_threads.submit(screen_ligand, entry, config, output_dir, executor, dft_executor): entry
+                       for entry in entries}
+            for future in as_completed(futures):
+                entry = futures[future]
+                try:
+                    future.result()
+                    logging.info(f'Finished screening ligand {entry.name}')
+                except Exception as exception:
+                    logging.exception(f'Screening ligand {entry.name} failed')
+                    failures[entry.name] = exception
+    logging.info(f'Screened {len(futures) - len(failures)} of {len(futures)} ligands')
+    return failures
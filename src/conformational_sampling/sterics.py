@@ -0,0 +1,84 @@
+import logging
+from itertools import chain
+
+import numpy as np
+import stk
+from ase.data import vdw_radii
+from scipy.spatial import cKDTree
+
+# used for elements without a tabulated van der Waals radius
+DEFAULT_VDW_RADIUS = 2.0
+# atomic numbers of H, He, B-Ne, Si-Ar, As-Kr, Te-Xe, At-Rn
+NONMETALS = {1, 2, 5, 6, 7, 8, 9, 10, 14, 15, 16, 17, 18, 33, 34, 35, 36, 52, 53, 54, 85, 86}
+
+
+class ClashDetector:
+    '''Finds overlapping atoms of different ligands in complexes that share a molecular graph
+
+    Only atoms at least two bonds from the metal are considered, since atoms bonded to the metal
+    are placed close together by construction and relaxed later by MCHammer. Two atoms clash if
+    they are closer than the sum of their van der Waals radii scaled by vdw_scale.
+    '''
+    def __init__(self, stk_mol: stk.ConstructedMolecule, vdw_scale: float) -> None:
+        atomic_numbers = np.array([atom.get_atomic_number() for atom in stk_mol.get_atoms()])
+        radii = vdw_radii[atomic_numbers]
+        self.radii = vdw_scale * np.where(np.isnan(radii), DEFAULT_VDW_RADIUS, radii)
+        self.building_block_ids = np.array([atom_info.get_building_block_id()
+                                            for atom_info in stk_mol.get_atom_infos()])
+
+        # exclude the metal and the atoms bonded to it
+        is_metal = ~np.isin(atomic_numbers, list(NONMETALS))
+        excluded = is_metal.copy()
+        for bond in stk_mol.get_bonds():
+            atom_ids = [bond.get_atom1().get_id(), bond.get_atom2().get_id()]
+            if is_metal[atom_ids].any():
+                excluded[atom_ids] = True
+        self.atom_ids = np.flatnonzero(~excluded)
+
+    def clashes(self, position_matrix):
+        'return the pairs of clashing atom ids and the overlap of each pair'
+        if len(self.atom_ids) == 0:
+            return np.empty((0, 2), dtype=int), np.empty(0)
+        positions = position_matrix[self.atom_ids]
+        radii = self.radii[self.atom_ids]
+        pairs = cKDTree(positions).query_pairs(2 * radii.max(), output_type='ndarray')
+        pairs = pairs[self.building_block_ids[self.atom_ids[pairs[:, 0]]]
+                      != self.building_block_ids[self.atom_ids[pairs[:, 1]]]]
+        distances = np.linalg.norm(positions[pairs[:, 0]] - positions[pairs[:, 1]], axis=1)
+        overlaps = radii[pairs[:, 0]] + radii[pairs[:, 1]] - distances
+        clashing = overlaps > 0
+        return self.atom_ids[pairs[clashing]], overlaps[clashing]
+
+    def score(self, stk_mol: stk.Molecule) -> float:
+        'total overlap of clashing atoms, zero if there are no clashes'
+        return float(self.clashes(stk_mol.get_position_matrix())[1].sum())
+
+
+def prune_clashes(complexes, vdw_scale: float, mode: str = 'reject'):
+    '''Lazily remove complexes with clashing ligands ('reject') or order them by clash ('rank')
+
+    Ranking needs the clash score of every complex, so all complexes are built up front.
+    '''
+    complexes = iter(complexes)
+    first = next(complexes, None)
+    if first is None:
+        return
+    detector = ClashDetector(first, vdw_scale)
+    complexes = chain([first], complexes)
+
+    if mode == 'reject':
+        num_pruned = 0
+        for complex in complexes:
+            if detector.score(complex) > 0:
+                num_pruned += 1
+            else:
+                yield complex
+        logging.debug(f'{num_pruned = } (complexes with steric clashes)')
+    elif mode == 'rank':
+        scores = [(detector.score(complex), complex) for complex in complexes]
+        logging.debug(f'{sum(score > 0 for score, _ in scores)} complexes with steric clashes '
+                      f'out of {len(scores)}, optimizing the least clashing first')
+        for _, complex in sorted(scores, key=lambda score_complex: score_complex[0]):
+            yield complex
+    else:
+        raise ValueError(f'unknown clash filter mode {mode!r}')
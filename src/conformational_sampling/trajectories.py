@@ -0,0 +1,41 @@
+from pathlib import Path
+
+import numpy as np
+
+from conformational_sampling.ase_stko_optimizer import max_force
+
+
+class TrajectoryRecorder:
+    '''ASE optimizer observer keeping the positions, energy and fmax of every step as arrays
+
+    A much smaller alternative to an ASE trajectory file, which stores whole Atoms objects with
+    their calculator results. save() writes the arrays to an npz file read by load_trajectory.
+    '''
+    def __init__(self, atoms) -> None:
+        self.atoms = atoms
+        self.positions = []
+        self.energies = []
+        self.fmax = []
+
+    def __call__(self) -> None:
+        self.positions.append(self.atoms.get_positions())
+        self.energies.append(self.atoms.get_potential_energy())
+        self.fmax.append(max_force(self.atoms.get_forces()))
+
+    def save(self, path: Path) -> None:
+        np.savez(
+            path,
+            numbers=self.atoms.get_atomic_numbers(),
+            positions=np.array(self.positions).reshape(-1, len(self.atoms), 3),
+            energies=np.array(self.energies),
+            fmax=np.array(self.fmax),
+        )
+
+
+def load_trajectory(path: Path):
+    '''Open a trajectory saved by TrajectoryRecorder
+
+    The arrays numbers, positions (num_steps, num_atoms, 3), energies and fmax are only read
+    from the file when accessed, so e.g. the energies can be read without the positions.
+    '''
+    return np.load(path)
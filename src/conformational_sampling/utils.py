@@ -1,7 +1,10 @@
+import ctypes
 import os
 import ase
+import ase.data
+import numpy as np
 from openbabel import pybel as pb
-from rdkit.Chem.rdmolfiles import MolToXYZBlock, MolFromMolBlock, MolToMolBlock
+from rdkit.Chem.rdmolfiles import MolFromMolBlock
 
 import stk
 from rdkit import Chem
@@ -13,7 +16,21 @@ def num_cpus():
         return 2
 
 
+def obmol_atoms(obmol) -> list:
+    return [obmol.GetAtom(i) for i in range(1, obmol.NumAtoms() + 1)]
+
+
+def obmol_positions(obmol) -> np.ndarray:
+    'copy of the coordinate array of an openbabel molecule, read directly from its memory'
+    if obmol.NumAtoms() == 0:
+        return np.zeros((0, 3))
+    coordinates = ctypes.c_double * (3 * obmol.NumAtoms())
+    return np.ctypeslib.as_array(coordinates.from_address(int(obmol.GetCoordinates()))).reshape(-1, 3).copy()
+
+
 def pybel_mol_to_rdkit_mol(pybel_mol):
+    # openbabel and rdkit write and parse mol blocks in C++, which is faster than copying the
+    # atoms and bonds one at a time through the python bindings of both
     rdkit_mol = MolFromMolBlock(pybel_mol.write('mol'), removeHs=False)
     Chem.rdmolops.Kekulize(rdkit_mol)
     return rdkit_mol
@@ -24,22 +41,56 @@ def rdkit_mol_to_stk_mol(rdkit_mol):
 
 
 def pybel_mol_to_stk_mol(pybel_mol):
-    return rdkit_mol_to_stk_mol(pybel_mol_to_rdkit_mol(pybel_mol))
+    'copy the atoms, bonds and positions of an openbabel molecule into an stk BuildingBlock'
+    obmol = pybel_mol.OBMol
+    atoms = tuple(stk.Atom(i, ob_atom.GetAtomicNum(), ob_atom.GetFormalCharge())
+                  for i, ob_atom in enumerate(obmol_atoms(obmol)))
+    bonds = tuple(stk.Bond(atoms[ob_bond.GetBeginAtomIdx() - 1], atoms[ob_bond.GetEndAtomIdx() - 1],
+                           ob_bond.GetBondOrder())
+                  for ob_bond in pb.ob.OBMolBondIter(obmol))
+    return stk.BuildingBlock.init(atoms, bonds, obmol_positions(obmol))
 
 
 def stk_mol_to_pybel_mol(stk_mol, reperceive_bonds=False):
+    '''Copy the atoms, bonds and positions of an stk molecule into an openbabel molecule
+
+    With reperceive_bonds, the bonds of the stk molecule are ignored and perceived from the
+    positions instead, as when reading an xyz file.
+    '''
+    obmol = pb.ob.OBMol()
+    obmol.BeginModify()
+    for atom, (x, y, z) in zip(stk_mol.get_atoms(), stk_mol.get_position_matrix()):
+        ob_atom = obmol.NewAtom()
+        ob_atom.SetAtomicNum(atom.get_atomic_number())
+        ob_atom.SetFormalCharge(atom.get_charge())
+        ob_atom.SetVector(float(x), float(y), float(z))
+    if not reperceive_bonds:
+        for bond in stk_mol.get_bonds():
+            obmol.AddBond(bond.get_atom1().get_id() + 1, bond.get_atom2().get_id() + 1, int(bond.get_order()))
+    obmol.EndModify()
     if reperceive_bonds:
-        return pb.readstring('xyz', MolToXYZBlock(stk_mol.to_rdkit_mol()))
-    else:
-        return pb.readstring('mol', MolToMolBlock(stk_mol.to_rdkit_mol()))
+        obmol.ConnectTheDots()
+        obmol.PerceiveBondOrders()
+    return pb.Molecule(obmol)
 
 
 def stk_mol_to_ase_atoms(stk_mol: stk.Molecule) -> ase.Atoms:
     return ase.Atoms(
-        positions=list(stk_mol.get_atomic_positions()),
-        numbers=[atom.get_atomic_number() for atom in stk_mol.get_atoms()]
+        numbers=[atom.get_atomic_number() for atom in stk_mol.get_atoms()],
+        positions=stk_mol.get_position_matrix(),
     )
-    
+
+
+def xyz_block(symbols, positions, comment='') -> str:
+    'format an xyz file entry the same way as rdkit\'s MolToXYZBlock, without building an rdkit molecule'
+    lines = [str(len(symbols)), comment]
+    lines += [f'{symbol:<3}{x:12.6f}{y:12.6f}{z:12.6f}' for symbol, (x, y, z) in zip(symbols, positions)]
+    return '\n'.join(lines) + '\n'
+
+
+def stk_mol_symbols(stk_mol: stk.Molecule) -> list:
+    return [ase.data.chemical_symbols[atom.get_atomic_number()] for atom in stk_mol.get_atoms()]
+
 
 def stk_metal(metal: str) -> stk.BuildingBlock:
     return stk.BuildingBlock(
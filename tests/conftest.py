@@ -0,0 +1,22 @@
+import pytest
+import stk
+
+from conformational_sampling.main import bind_to_dimethyl_Pd
+
+
+@pytest.fixture
+def clashing_complexes():
+    '''a phosphine bound to dimethyl palladium, the same complex with a methyl hydrogen moved onto
+    the terminal carbon of the phosphine, and the ids of those two atoms'''
+    ligand = stk.BuildingBlock(
+        'CPCC', functional_groups=[stk.SmartsFunctionalGroupFactory(smarts='P', bonders=(0,), deleters=())]
+    )
+    complex = bind_to_dimethyl_Pd(ligand)
+    position_matrix = complex.get_position_matrix()
+    ligand_atom_id = next(
+        atom_info.get_atom().get_id() for atom_info in complex.get_atom_infos()
+        if atom_info.get_building_block() is ligand and atom_info.get_building_block_atom().get_id() == 3
+    )
+    methyl_atom_id = complex.get_num_atoms() - 1
+    position_matrix[methyl_atom_id] = position_matrix[ligand_atom_id] + 0.5
+    return complex, complex.with_position_matrix(position_matrix), (ligand_atom_id, methyl_atom_id)
@@ -0,0 +1,44 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from ase.build import molecule
+from ase.calculators.emt import EMT
+from ase.optimize import BFGS
+
+from conformational_sampling.accounting import CountingCalculator, counted_calls, counting_calculator
+from conformational_sampling.profiling import Profiler
+
+
+def optimize(tag=None):
+    atoms = molecule('CH3CH2OH')
+    atoms.calc = counting_calculator(EMT(), tag)
+    BFGS(atoms, logfile=None).run(fmax=0.1, steps=5)
+    return atoms.get_potential_energy()
+
+
+def test_counting_calculator():
+    atoms = molecule('CH4')
+    calculator = CountingCalculator(EMT())
+    atoms.calc = calculator
+    energy = atoms.get_potential_energy()
+    atoms.get_forces()
+    assert energy == EMT().get_potential_energy(molecule('CH4'))
+    atoms.positions[0, 0] += 0.1
+    atoms.get_forces()
+    calculator.reset()
+    atoms.get_forces()
+    assert [call.repeated for call in calculator.calls] == [False, False, True]
+
+
+def test_counted_calls():
+    assert isinstance(counting_calculator(EMT()), EMT)
+    with counted_calls() as calls:
+        optimize(tag='node')
+    assert len(calls) == 6 and {call.tag for call in calls} == {'node'}
+
+    profiler = Profiler()
+    with ThreadPoolExecutor(1) as executor:
+        list(profiler.map(executor, 'opt', [7], optimize, ['node']))
+    summary = profiler.summary()
+    assert summary['stages']['opt']['calculator_calls']['calls'] == 6
+    assert summary['stages']['opt']['calculator_calls']['by_tag']['node']['calls'] == 6
+    assert summary['conformers']['7']['opt']['repeated'] == 0
@@ -0,0 +1,15 @@
+import numpy as np
+import stk
+from ase.calculators.emt import EMT
+from conformational_sampling.ase_stko_optimizer import ASE
+from conformational_sampling.utils import stk_mol_to_ase_atoms
+
+
+def test_optimize_with_energy():
+    butane = stk.BuildingBlock('CCCC')
+    result = ASE(EMT(), fmax=0.1).optimize_with_energy(butane)
+    assert not np.allclose(result.stk_mol.get_position_matrix(), butane.get_position_matrix())
+    assert result.steps > 0 and result.fmax < 0.1
+    ase_mol = stk_mol_to_ase_atoms(result.stk_mol)
+    ase_mol.calc = EMT()
+    assert np.isclose(result.energy, ase_mol.get_potential_energy())
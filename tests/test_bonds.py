@@ -0,0 +1,61 @@
+from itertools import islice
+from pathlib import Path
+
+import numpy as np
+import stk
+from openbabel import pybel as pb
+
+from conformational_sampling import ensemble as ensemble_module
+from conformational_sampling.bonds import adjacency_matrix, num_connectivity_differences, perceive_bonds
+from conformational_sampling.ensemble import ConformerEnsemble
+from conformational_sampling.utils import obmol_positions
+
+SAMPLE_OUTPUT = Path(__file__).parent.parent / 'examples' / 'dppe' / 'sample_output'
+
+
+def openbabel_adjacency(pybel_mol):
+    adjacency = np.zeros((len(pybel_mol.atoms),) * 2, dtype=bool)
+    for bond in pb.ob.OBMolBondIter(pybel_mol.OBMol):
+        i, j = bond.GetBeginAtomIdx() - 1, bond.GetEndAtomIdx() - 1
+        adjacency[i, j] = adjacency[j, i] = True
+    return adjacency
+
+
+def test_perceive_bonds_matches_openbabel():
+    # the 20 conformers that kept their connectivity, openbabel drops Pd bonds of the distorted rest
+    pybel_mols = pb.readfile('xyz', str(SAMPLE_OUTPUT / 'conformers_4_dft.xyz'))
+    for pybel_mol in islice(pybel_mols, 20):
+        numbers = [atom.atomicnum for atom in pybel_mol.atoms]
+        adjacency = perceive_bonds(numbers, obmol_positions(pybel_mol.OBMol))
+        assert num_connectivity_differences(adjacency, openbabel_adjacency(pybel_mol)) == 0
+
+
+def test_connectivity_changes(monkeypatch):
+    butane = stk.BuildingBlock('CCCC')
+    numbers = [atom.get_atomic_number() for atom in butane.get_atoms()]
+    positions = butane.get_position_matrix()
+    stretched = positions.copy()
+    # pull the last carbon and its hydrogens away, breaking one C-C bond
+    last_carbon = [3] + [bond.get_atom2().get_id() for bond in butane.get_bonds()
+                         if bond.get_atom1().get_id() == 3 and bond.get_atom2().get_atomic_number() == 1]
+    stretched[last_carbon] += 5.0
+    batch = perceive_bonds(numbers, np.stack([positions, stretched]))
+    assert batch.shape == (2, butane.get_num_atoms(), butane.get_num_atoms())
+    assert list(num_connectivity_differences(batch, adjacency_matrix(butane))) == [0, 1]
+
+    ensemble = ConformerEnsemble(butane, num_stages=2)
+    ensemble.append(positions)
+    ensemble.append(positions)
+    ensemble.set_positions(1, 1, stretched)
+    assert list(ensemble.connectivity_changes(1)) == [-1, 1]
+    ensemble.reorder([1, 0])
+    assert list(ensemble.connectivity_changes(1)) == [1, -1]
+    ensemble.set_positions(0, 1, positions)
+    assert list(ensemble.connectivity_changes(1)) == [0, -1]
+
+    # perceived in chunks of one conformer
+    monkeypatch.setattr(ensemble_module, 'MAX_BATCH_ELEMENTS', 1)
+    for i in range(3):
+        ensemble.append(positions)
+        ensemble.set_positions(2 + i, 1, stretched if i % 2 else positions)
+    assert list(ensemble.connectivity_changes(1)) == [0, -1, 0, 1, 0]
@@ -0,0 +1,37 @@
+import numpy as np
+import stk
+from conformational_sampling.cache import CachedCalculation, StageCache
+
+
+def test_stage_cache(tmp_path):
+    cache = StageCache(tmp_path)
+    butane = stk.BuildingBlock('CCCC')
+    key = cache.key(butane, 'xtb', {'fmax': 0.1})
+    assert cache.get(key) is None
+    # positions are rounded before hashing and the stage settings are part of the key
+    assert cache.key(butane.with_displacement([1e-7, 0, 0]), 'xtb', {'fmax': 0.1}) == key
+    assert cache.key(butane, 'xtb', {'fmax': 0.05}) != key
+    assert cache.key(butane, 'dft', {'fmax': 0.1}) != key
+
+    cache.put(key, butane.get_position_matrix(), -1.5)
+    entry = cache.get(key)
+    assert np.allclose(entry.positions, butane.get_position_matrix())
+    assert entry.energy == -1.5
+
+    cache.max_bytes = 0
+    cache.evict()
+    assert cache.get(key) is None
+
+
+def test_cached_calculation(tmp_path):
+    calls = []
+    def displace(stk_mol):
+        calls.append(stk_mol)
+        return stk_mol.with_displacement([1, 0, 0])
+
+    butane = stk.BuildingBlock('CCCC')
+    cached_displace = CachedCalculation(displace, StageCache(tmp_path), 'displace')
+    first = cached_displace(butane)
+    second = cached_displace(butane)
+    assert len(calls) == 1
+    assert np.allclose(first.get_position_matrix(), second.get_position_matrix())
@@ -0,0 +1,49 @@
+import numpy as np
+import stk
+from xtb.ase.calculator import XTB
+
+from conformational_sampling.accounting import counted_calls
+from conformational_sampling.calculators import init_xtb_worker, xtb_calculator
+from conformational_sampling.main import xtb_optimize
+from conformational_sampling.utils import stk_mol_to_ase_atoms
+
+
+def test_xtb_calculator_is_reused():
+    calculator = xtb_calculator()
+    ase_mol = stk_mol_to_ase_atoms(stk.BuildingBlock('CCO'))
+    ase_mol.calc = calculator
+    energy = ase_mol.get_potential_energy()
+
+    # the same calculator is returned, without the wavefunction of the last molecule, and computes
+    # a displaced molecule instead of reusing results
+    assert calculator._res is not None
+    assert xtb_calculator() is calculator
+    assert calculator._res is None
+    ase_mol = ase_mol.copy()
+    ase_mol.positions[0, 0] += 0.1
+    ase_mol.calc = calculator
+    assert ase_mol.get_potential_energy() != energy
+    assert xtb_calculator('GFN1-xTB') is not calculator
+
+
+def test_xtb_api_calculator_built_once_per_molecule(monkeypatch):
+    constructions = []
+    create_api_calculator = XTB._create_api_calculator
+
+    def counting_create_api_calculator(self):
+        constructions.append(self.atoms.get_chemical_formula())
+        return create_api_calculator(self)
+
+    monkeypatch.setattr(XTB, '_create_api_calculator', counting_create_api_calculator)
+    init_xtb_worker()
+    ethanol = stk.BuildingBlock('CCO')
+    # two tasks on conformers of the same molecule in one worker, then a different molecule
+    first = xtb_optimize(ethanol)
+    second = xtb_optimize(ethanol.with_displacement(np.array([2.0, 0, 0])))
+    assert abs(first.energy - second.energy) < 1e-4
+    xtb_optimize(stk.BuildingBlock('CCN'))
+    assert constructions == ['C2H6O', 'C2H7N']
+    # also when the calculator is wrapped for counting in a profiled task
+    with counted_calls():
+        xtb_optimize(stk.BuildingBlock('CCN').with_displacement(np.array([2.0, 0, 0])))
+    assert constructions == ['C2H6O', 'C2H7N']
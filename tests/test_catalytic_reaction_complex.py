@@ -0,0 +1,21 @@
+from itertools import product
+
+import pytest
+from conformational_sampling.catalytic_reaction_complex import sample_product_indices
+
+
+def test_sample_product_indices_without_cap():
+    sizes = (2, 3, 4)
+    assert list(sample_product_indices(sizes)) == list(product(range(2), range(3), range(4)))
+    assert len(list(sample_product_indices(sizes, max_samples=100))) == 24
+
+
+@pytest.mark.parametrize('sampling', ['random', 'stratified'])
+def test_sample_product_indices_with_cap(sampling):
+    sizes = (5, 100, 100)
+    samples = list(sample_product_indices(sizes, max_samples=23, sampling=sampling))
+    assert len(samples) == len(set(samples)) == 23
+    assert all(0 <= index < size for sample in samples for index, size in zip(sample, sizes))
+    if sampling == 'stratified':
+        counts = [sum(sample[0] == i for sample in samples) for i in range(sizes[0])]
+        assert set(counts) == {4, 5}
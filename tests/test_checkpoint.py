@@ -0,0 +1,91 @@
+import signal
+import subprocess
+import sys
+
+import numpy as np
+import stk
+from conformational_sampling.checkpoint import Checkpoint
+from conformational_sampling.config import Config
+from conformational_sampling.main import MC_HAMMER, METAL_OPTIMIZER, ConformerEnsembleOptimizer
+
+
+def test_checkpoint_partial_record(tmp_path):
+    path = tmp_path / 'checkpoint.pkl'
+    checkpoint = Checkpoint(path)
+    checkpoint.record('energy', 0, 3, -1.5)
+    checkpoint.record('energy', 1, 3, -2.5)
+    checkpoint.close()
+    # simulate a job killed while writing the last record
+    with open(path, 'r+b') as file:
+        file.truncate(path.stat().st_size - 3)
+    assert Checkpoint.read(path) == [('energy', 0, 3, -1.5)]
+
+    checkpoint = Checkpoint(path, append=True)
+    checkpoint.record('energy', 2, 3, -3.5)
+    checkpoint.close()
+    assert Checkpoint.read(path) == [('energy', 0, 3, -1.5), ('energy', 2, 3, -3.5)]
+
+
+def test_resume(tmp_path):
+    path = tmp_path / 'checkpoint.pkl'
+    butane = stk.BuildingBlock('CCCC')
+    checkpoint = Checkpoint(path)
+    checkpoint.record('template', butane)
+    checkpoint.record('conformer', 0, butane.get_position_matrix())
+    checkpoint.record('conformer', 1, butane.get_position_matrix() + 1)
+    checkpoint.record('stage', 0, MC_HAMMER, butane.get_position_matrix() + 2)
+    checkpoint.record('stage', 1, MC_HAMMER, None)
+    checkpoint.close()
+
+    optimizer = ConformerEnsembleOptimizer.resume(
+        Config(checkpoint_path=path), [butane, butane, butane.with_displacement([3, 0, 0])]
+    )
+    first, second = optimizer.conformers
+    assert np.allclose(first.stages[MC_HAMMER].get_position_matrix(), butane.get_position_matrix() + 2)
+    assert METAL_OPTIMIZER not in first.stages
+    assert second.failed_stages == {MC_HAMMER}
+    # conformers already recorded are skipped in the unoptimized conformers
+    optimizer.next_conformers(10)
+    assert len(optimizer.conformers) == 3
+    assert np.allclose(optimizer.conformers[2].stages[0].get_position_matrix(),
+                       butane.get_position_matrix() + [3, 0, 0])
+
+
+def test_resume_with_clash_filter(tmp_path, clashing_complexes):
+    path = tmp_path / 'checkpoint.pkl'
+    complex, clashing_complex, _ = clashing_complexes
+    shifted_complex = complex.with_displacement([3, 0, 0])
+
+    # the clashing complex was rejected before the recorded conformer
+    checkpoint = Checkpoint(path)
+    checkpoint.record('template', complex)
+    checkpoint.record('conformer', 0, complex.get_position_matrix())
+    checkpoint.close()
+
+    optimizer = ConformerEnsembleOptimizer.resume(
+        Config(checkpoint_path=path, clash_filter='reject'), [clashing_complex, complex, shifted_complex]
+    )
+    optimizer.next_conformers(10)
+    assert len(optimizer.conformers) == 2
+    assert np.allclose(optimizer.conformers[1].stages[0].get_position_matrix(),
+                       shifted_complex.get_position_matrix())
+
+
+def test_sync_on_signals(tmp_path):
+    # a checkpoint written by another thread, as in a screen, is synced before the signal kills the job
+    script = f'''
+import os, signal, threading
+from conformational_sampling.checkpoint import Checkpoint, sync_on_signals
+sync_on_signals()
+def optimize():
+    checkpoint = Checkpoint({str(tmp_path / 'checkpoint.pkl')!r})
+    checkpoint.record('energy', 0, 3, -1.5)
+thread = threading.Thread(target=optimize)
+thread.start()
+thread.join()
+os.kill(os.getpid(), signal.SIGUSR1)
+'''
+    process = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True)
+    assert process.returncode == -signal.SIGUSR1
+    assert 'Received SIGUSR1, syncing checkpoint' in process.stderr
+    assert Checkpoint.read(tmp_path / 'checkpoint.pkl') == [('energy', 0, 3, -1.5)]
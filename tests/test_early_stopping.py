@@ -0,0 +1,32 @@
+import pytest
+from ase.build import molecule
+from ase.calculators.emt import EMT
+from ase.optimize import BFGS
+from ase.units import kcal, mol
+
+from conformational_sampling.early_stopping import BestEnergyBoard, EnergyWindowExceeded, EnergyWindowObserver
+
+
+def test_best_energy_board(tmp_path):
+    board = BestEnergyBoard(tmp_path / 'board')
+    assert board.best() == float('inf')
+    board.publish('0', -1.0)
+    board.publish('1', -3.0)
+    board.publish('0', -2.0)
+    assert board.best() == -3.0
+    board.clear()
+    assert board.best() == float('inf')
+
+
+def test_energy_window_observer(tmp_path):
+    board = BestEnergyBoard(tmp_path / 'board')
+    atoms = molecule('H2O')
+    atoms.calc = EMT()
+    board.publish('best', atoms.get_potential_energy() - 1000 * kcal / mol)
+    observer = EnergyWindowObserver(atoms, board, 'water', window=1.0, patience=2)
+    opt = BFGS(atoms, logfile=None)
+    opt.attach(observer)
+    with pytest.raises(EnergyWindowExceeded):
+        opt.run(fmax=1e-6, steps=50)
+    assert observer.steps_above == 2
+    assert opt.nsteps == 1
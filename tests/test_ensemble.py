@@ -0,0 +1,23 @@
+import numpy as np
+import stk
+from conformational_sampling.ensemble import ConformerEnsemble, StageEnergies, StageMolecules
+
+
+def test_conformer_ensemble():
+    butane = stk.BuildingBlock('CCCC')
+    ensemble = ConformerEnsemble(butane, num_stages=3, capacity=1)
+    for shift in range(3):
+        ensemble.append(butane.get_position_matrix() + shift)
+    assert ensemble.positions.shape == (3, 3, butane.get_num_atoms(), 3)
+    ensemble.set_positions(1, 2, butane.get_position_matrix() - 1)
+    ensemble.set_energy(1, 2, -1.5)
+
+    stages = StageMolecules(ensemble, 1)
+    energies = StageEnergies(ensemble, 1)
+    assert list(stages) == [0, 2] and 1 not in stages
+    assert np.allclose(stages[2].get_position_matrix(), butane.get_position_matrix() - 1)
+    assert dict(energies) == {2: -1.5}
+
+    ensemble.reorder([1, 2, 0])
+    assert ensemble.energies[0, 2] == -1.5
+    assert np.allclose(ensemble.positions[2, 0], butane.get_position_matrix())
@@ -0,0 +1,24 @@
+import os
+
+import pytest
+from conformational_sampling.config import Config
+from conformational_sampling.executors import stage_executor
+
+
+def worker_threads():
+    return os.environ['OMP_NUM_THREADS']
+
+
+@pytest.mark.parametrize('executor', ['process', 'dask'])
+def test_stage_executor(executor):
+    if executor == 'dask':
+        pytest.importorskip('distributed')
+    with stage_executor(Config(num_cpus=2, executor=executor), threads_per_task=2) as pool:
+        assert pool.submit(worker_threads).result() == '2'
+        assert list(pool.map(pow, [2, 3], [2, 2])) == [4, 9]
+
+
+def test_unknown_executor():
+    with pytest.raises(ValueError):
+        with stage_executor(Config(executor='threads')):
+            pass
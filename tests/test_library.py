@@ -0,0 +1,57 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import stk
+from ase.units import kcal, mol
+
+from conformational_sampling.ensemble import ConformerEnsemble
+from conformational_sampling.library import LigandLibrary
+
+
+def butane_ensemble(energies):
+    'butane conformers with the given energies (kcal/mol) at stage 1'
+    butane = stk.BuildingBlock('CCCC')
+    ensemble = ConformerEnsemble(butane, num_stages=2)
+    for i, energy in enumerate(energies):
+        ensemble.append(butane.get_position_matrix() + i)
+        ensemble.set_positions(i, 1, butane.get_position_matrix() - i)
+        ensemble.set_energy(i, 1, energy * kcal / mol)
+    return ensemble
+
+
+def add_ligand(path, name, energies):
+    with LigandLibrary(path) as library:
+        library.add_ensemble(name, butane_ensemble(energies), smiles='CCCC')
+
+
+def test_ligand_library(tmp_path):
+    path = tmp_path / 'library.sqlite'
+    add_ligand(path, 'a', [2.0, 0.0, 5.0])
+    add_ligand(path, 'b', [0.0, 1.0, 2.0, 10.0])
+    with LigandLibrary(path) as library:
+        assert library.ligands() == ['a', 'b']
+        assert library.symbols('a') == ['C'] * 4 + ['H'] * 10
+
+        lowest = library.lowest_energy_conformer('a', 1)
+        assert lowest.conformer == 1
+        assert np.isclose(lowest.energy, 0.0)
+        assert np.allclose(lowest.positions, stk.BuildingBlock('CCCC').get_position_matrix() - 1)
+        assert library.lowest_energy_conformer('a', 0) is None
+
+        assert library.ligands_with_conformers_in_window(1, window=3.0, min_conformers=1) == {'a': 2, 'b': 3}
+        assert library.ligands_with_conformers_in_window(1, window=3.0, min_conformers=2) == {'b': 3}
+
+    # adding a ligand again replaces it
+    add_ligand(path, 'a', [0.0])
+    with LigandLibrary(path) as library:
+        assert library.energies('a', 1) == {0: 0.0}
+
+
+def test_concurrent_writers(tmp_path):
+    path = tmp_path / 'library.sqlite'
+    names = [str(i) for i in range(8)]
+    with ProcessPoolExecutor(4) as executor:
+        list(executor.map(add_ligand, [path] * len(names), names, [[0.0, 1.0]] * len(names)))
+    with LigandLibrary(path) as library:
+        assert library.ligands() == names
+        assert all(len(library.energies(name, 1)) == 2 for name in names)
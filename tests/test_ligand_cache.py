@@ -0,0 +1,60 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import stk
+from rdkit import Chem
+
+from conformational_sampling.cache import StageCache
+from conformational_sampling.ligand_cache import LigandConformerCache
+from conformational_sampling.config import Config
+from conformational_sampling.main import gen_confs_openbabel, gen_confs_openbabel_concurrently
+
+PHOSPHINE = stk.SmartsFunctionalGroupFactory(smarts='P', bonders=(0,), deleters=())
+
+
+def test_ligand_conformer_cache(tmp_path):
+    ligand = stk.BuildingBlock('CPCC', [PHOSPHINE])
+    conformers = [ligand.with_displacement([i, 0, 0]) for i in range(3)]
+    cache = LigandConformerCache(StageCache(tmp_path))
+    parameters = {'initial_conformers': 3}
+    assert cache.get(ligand, parameters) is None
+    cache.put(ligand, parameters, conformers)
+
+    # the same ligand with its atoms in reverse order
+    order = list(reversed(range(ligand.get_num_atoms())))
+    rdkit_mol = Chem.RenumberAtoms(ligand.to_rdkit_mol(), order)
+    reordered_ligand = stk.BuildingBlock.init_from_rdkit_mol(rdkit_mol, [PHOSPHINE])
+    cached_conformers = cache.get(reordered_ligand, parameters)
+    assert len(cached_conformers) == 3
+    heavy_atoms = [i for i, atom in enumerate(reordered_ligand.get_atoms()) if atom.get_atomic_number() > 1]
+    for conformer, cached_conformer in zip(conformers, cached_conformers):
+        positions = conformer.get_position_matrix()[order]
+        cached_positions = cached_conformer.get_position_matrix()
+        assert np.allclose(positions[heavy_atoms], cached_positions[heavy_atoms])
+        # equivalent hydrogens can be swapped
+        assert np.allclose(np.sort(positions, axis=0), np.sort(cached_positions, axis=0))
+
+    assert cache.get(ligand, {'initial_conformers': 4}) is None
+    assert cache.get(stk.BuildingBlock('CPCC'), parameters) is None
+
+
+def test_gen_confs_openbabel_cached(tmp_path):
+    ligand = stk.BuildingBlock('CPCC', [PHOSPHINE])
+    config = Config(initial_conformers=4, cache_path=tmp_path)
+    conformers = gen_confs_openbabel(ligand, config)
+    cached_conformers = gen_confs_openbabel(ligand, config)
+    assert [conformer.get_position_matrix().tolist() for conformer in conformers] == \
+        [conformer.get_position_matrix().tolist() for conformer in cached_conformers]
+
+
+def test_gen_confs_openbabel_concurrently(tmp_path):
+    ligands = [stk.BuildingBlock('CPCC', [PHOSPHINE]), stk.BuildingBlock('CPC', [PHOSPHINE])]
+    # searched on the stage executor of the config, then served from the cache
+    config = Config(initial_conformers=2, num_cpus=2, cache_path=tmp_path)
+    conformers = gen_confs_openbabel_concurrently(ligands, config)
+    assert len(conformers) == 2 and all(conformers)
+    with ThreadPoolExecutor(1) as executor:
+        cached_conformers = gen_confs_openbabel_concurrently(ligands, config, executor)
+    for ligand_conformers, ligand_cached_conformers in zip(conformers, cached_conformers):
+        assert [conformer.get_position_matrix().tolist() for conformer in ligand_conformers] == \
+            [conformer.get_position_matrix().tolist() for conformer in ligand_cached_conformers]
@@ -4,10 +4,15 @@ from pathlib import Path
 import numpy as np
 import pytest
 import stk
+from ase.calculators.emt import EMT
+
+from conformational_sampling import main
 from conformational_sampling.config import Config
 from conformational_sampling.main import (
+    XTB,
     ConformerEnsembleOptimizer,
     bind_to_dimethyl_Pd,
+    dft_optimize,
     gen_confs_openbabel,
     load_stk_mol,
 )
@@ -55,10 +60,9 @@ def test_metal_ligand_binding(ligand_path):
     stk_mol = bind_to_dimethyl_Pd(stk_ligand)
     
 
-# it might work to try using a pytest.ini file in the repo root like here:
-# https://github.com/pytest-dev/pytest/discussions/10027#discussioncomment-2906684
-@pytest.mark.skip(reason='sorting out OMP_NUM_THREADS')
-def test_conformer_ensemble_optimizer():
+@pytest.mark.parametrize('streaming', [False, True])
+def test_conformer_ensemble_optimizer(tmp_path, monkeypatch, streaming):
+    monkeypatch.chdir(tmp_path)
     simple_ligand = stk.BuildingBlock('CPCC')
     functional_group_factory = stk.SmartsFunctionalGroupFactory(
         smarts='P',
@@ -71,7 +75,50 @@ def test_conformer_ensemble_optimizer():
     )
     simple_complex = bind_to_dimethyl_Pd(simple_ligand)
 
-    config = Config(initial_conformers=2)
+    config = Config(initial_conformers=2, num_cpus=2, streaming=streaming)
     stk_confs = gen_confs_openbabel(simple_complex, config)
     assert len(stk_confs) == 2
-    ConformerEnsembleOptimizer(stk_confs, config).optimize()
+    optimizer = ConformerEnsembleOptimizer(stk_confs, config)
+    xtb_complexes = optimizer.optimize()
+    assert 0 < len(xtb_complexes) <= len(stk_confs)
+    assert all(len(conformer.stages) == 3 for conformer in optimizer.conformers
+               if XTB not in conformer.stages)
+    assert Path('conformers_3_xtb.xyz').exists()
+
+
+def test_select_dft_conformers():
+    butane = stk.BuildingBlock('CCCC')
+    config = Config(dft_energy_window=5, max_dft_conformers=2, post_xtb_rms_threshold=0.5)
+    optimizer = ConformerEnsembleOptimizer([butane], config)
+    optimizer.next_conformers(1)
+    ensemble = optimizer.ensemble
+    # energies in eV, 1 kcal/mol is about 0.043 eV
+    for shift, energy in [(0, -1.0), (5, -1.1), (5.1, -1.05), (10, -0.5), (15, -0.9)]:
+        i = ensemble.append(butane.get_position_matrix())
+        ensemble.set_positions(i, XTB, butane.get_position_matrix() + shift)
+        ensemble.set_energy(i, XTB, energy)
+    # 4 is outside the window, 3 is a duplicate of 2 and 5 is beyond the lowest 2
+    assert optimizer.select_dft_conformers(range(1, 6)) == [2, 1]
+
+
+def test_no_conformers(tmp_path):
+    # e.g. all rejected by the clash filter
+    config = Config(ase_calculator=EMT(), output_dir=tmp_path)
+    assert ConformerEnsembleOptimizer([], config).optimize() == []
+
+
+def test_dft_xtb_hessian_only_for_bfgs(tmp_path, monkeypatch):
+    hessians = []
+
+    def finite_difference_hessian(atoms, calculator):
+        hessians.append(len(atoms))
+        return 70 * np.eye(3 * len(atoms))
+
+    monkeypatch.setattr(main, 'finite_difference_hessian', finite_difference_hessian)
+    ethanol = stk.BuildingBlock('CCO')
+    for optimizer in ('FIRE', 'PreconLBFGS', 'BFGS'):
+        config = Config(ase_calculator=EMT(), dft_optimizer=optimizer, dft_xtb_hessian=True,
+                        max_dft_opt_steps=1, output_dir=tmp_path)
+        assert dft_optimize(0, ethanol, config) is not None
+    # only BFGS uses the Hessian
+    assert hessians == [ethanol.get_num_atoms()]
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+from ase.build import molecule
+from ase.calculators.emt import EMT
+
+from conformational_sampling.optimizers import (
+    finite_difference_hessian,
+    make_optimizer,
+    positive_definite,
+)
+
+
+def test_positive_definite():
+    hessian = np.diag([-2.0, 0.0, 5.0])
+    assert np.allclose(np.linalg.eigvalsh(positive_definite(hessian, 1.0)), [1.0, 2.0, 5.0])
+
+
+def test_warm_start():
+    def num_steps(hessian):
+        atoms = molecule('CH3CH2OH')
+        atoms.rattle(0.05, seed=0)
+        atoms.calc = EMT()
+        if hessian is True:
+            hessian = positive_definite(finite_difference_hessian(atoms, EMT()))
+        opt = make_optimizer('BFGS', atoms, hessian=hessian, logfile=None)
+        assert opt.run(fmax=0.01, steps=200)
+        return opt.nsteps
+
+    assert num_steps(True) < num_steps(None)
+
+
+def test_unknown_optimizer():
+    with pytest.raises(ValueError):
+        make_optimizer('SteepestDescent', molecule('H2O'))
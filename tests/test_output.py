@@ -0,0 +1,21 @@
+import stk
+from conformational_sampling.output import ConformerWriter
+from conformational_sampling.utils import stk_mol_symbols
+from rdkit.Chem.rdmolfiles import MolToXYZBlock
+
+
+def test_conformer_writer(tmp_path):
+    butane = stk.BuildingBlock('CCCC')
+    shifted = butane.with_displacement([1, 0, 0])
+    path = tmp_path / 'conformers.xyz'
+    writer = ConformerWriter({0: path}, stk_mol_symbols(butane))
+    writer.append(0, shifted.get_position_matrix(), -1.5)
+    writer.append(0, butane.get_position_matrix())
+    assert path.read_text().count('\n') == 2 * (butane.get_num_atoms() + 2)
+
+    writer.compact(0, [butane.get_position_matrix(), shifted.get_position_matrix()], [None, -1.5])
+    writer.close()
+    rdkit_mol = shifted.to_rdkit_mol()
+    rdkit_mol.SetProp('_Name', '-1.5')
+    # matches the output of rdkit, in the compacted order
+    assert path.read_text() == MolToXYZBlock(butane.to_rdkit_mol()) + MolToXYZBlock(rdkit_mol)
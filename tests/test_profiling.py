@@ -0,0 +1,51 @@
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import pytest
+
+from conformational_sampling.profiling import Profiler, span
+
+
+def square(x):
+    with span('sleep'):
+        time.sleep(0.01)
+    return x * x
+
+
+def fail(x):
+    raise ValueError(x)
+
+
+def test_profiler(tmp_path):
+    profiler = Profiler()
+    with ProcessPoolExecutor(2) as executor:
+        with profiler.stage('squares'):
+            assert list(profiler.map(executor, 'squares', [3, 4], square, [1, 2])) == [1, 4]
+        future = profiler.submit(executor, 'failing', 5, fail, 5)
+        wait([future])
+        with pytest.raises(ValueError):
+            future.result()
+
+    summary = profiler.summary()
+    squares = summary['stages']['squares']
+    assert squares['tasks'] == 2 and squares['failed_tasks'] == 0
+    assert squares['task_wall'] >= 0.02 and squares['wall'] >= squares['task_wall_max']
+    assert squares['peak_rss'] > 0 and 0 < squares['utilization'] <= 1
+    assert summary['stages']['failing']['failed_tasks'] == 1
+    task = next(task for task in summary['tasks'] if task['conformer'] == 3)
+    assert task['queue_wait'] >= 0 and task['spans'][0][0] == 'sleep'
+
+    profiler.write(tmp_path)
+    assert json.loads((tmp_path / 'profile_summary.json').read_text())['stages']['squares']['tasks'] == 2
+    events = json.loads((tmp_path / 'profile_trace.json').read_text())['traceEvents']
+    names = {event['name'] for event in events if event['ph'] == 'X'}
+    assert {'squares', 'squares 3', 'squares 4', 'sleep'} <= names
+
+
+def test_disabled_profiler(tmp_path):
+    profiler = Profiler(enabled=False)
+    with ThreadPoolExecutor(1) as executor, profiler.stage('squares'):
+        assert list(profiler.map(executor, 'squares', [0], square, [3])) == [9]
+    profiler.write(tmp_path)
+    assert not profiler.tasks and not profiler.stages and not list(tmp_path.iterdir())
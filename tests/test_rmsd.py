@@ -0,0 +1,57 @@
+import numpy as np
+import stk
+from rdkit import Chem
+from rdkit.Chem import AllChem
+
+from conformational_sampling.rmsd import (
+    UniqueConformerFilter,
+    heavy_atom_symmetries,
+    principal_radii,
+    rms,
+)
+
+
+def embedded_conformers(smiles, num_conformers):
+    rdkit_mol = Chem.AddHs(Chem.MolFromSmiles(smiles))
+    conformer_ids = AllChem.EmbedMultipleConfs(rdkit_mol, num_conformers, randomSeed=1)
+    stk_mol = stk.BuildingBlock.init_from_rdkit_mol(rdkit_mol)
+    return [stk_mol.with_position_matrix(rdkit_mol.GetConformer(i).GetPositions())
+            for i in conformer_ids]
+
+
+def test_rms_matches_rdkit():
+    'symmetry aware RMS should agree with rdkit, including symmetric nitro and tert-butyl groups'
+    stk_mols = embedded_conformers('CC(C)(C)c1ccc([N+](=O)[O-])cc1', 5)
+    heavy_ids, permutations = heavy_atom_symmetries(stk_mols[0])
+    positions = np.array([stk_mol.get_position_matrix()[heavy_ids] for stk_mol in stk_mols])
+    rdkit_mols = [Chem.RemoveHs(stk_mol.to_rdkit_mol()) for stk_mol in stk_mols]
+    for i, rdkit_mol in enumerate(rdkit_mols):
+        in_place = [AllChem.CalcRMS(rdkit_mol, other) for other in rdkit_mols]
+        # GetBestRMS aligns the probe molecule in place, so align a copy
+        aligned = [AllChem.GetBestRMS(Chem.Mol(rdkit_mol), other) for other in rdkit_mols]
+        assert np.allclose(rms(positions[i], positions, permutations), in_place, atol=1e-6)
+        assert np.allclose(rms(positions[i], positions, permutations, align=True), aligned, atol=1e-5)
+
+
+def test_unique_conformer_filter():
+    stk_mols = embedded_conformers('CCCCCCO', 10)
+    rdkit_mols = [Chem.RemoveHs(stk_mol.to_rdkit_mol()) for stk_mol in stk_mols]
+    threshold = 1.0
+    expected = []
+    for i, rdkit_mol in enumerate(rdkit_mols):
+        if all(AllChem.CalcRMS(rdkit_mol, rdkit_mols[j]) >= threshold for j in expected):
+            expected.append(i)
+    unique_filter = UniqueConformerFilter(stk_mols[0], threshold)
+    assert [i for i, stk_mol in enumerate(stk_mols) if unique_filter.add(stk_mol)] == expected
+    assert 1 < len(expected) < len(stk_mols)
+
+
+def test_principal_radii_lower_bound():
+    'descriptor distances must never exceed the RMS or the shape index could drop duplicates'
+    stk_mols = embedded_conformers('CCCCCCO', 10)
+    heavy_ids, permutations = heavy_atom_symmetries(stk_mols[0])
+    positions = np.array([stk_mol.get_position_matrix()[heavy_ids] for stk_mol in stk_mols])
+    descriptors = np.array([principal_radii(conformer) for conformer in positions])
+    for i in range(len(positions)):
+        lower_bounds = np.linalg.norm(descriptors - descriptors[i], axis=1)
+        assert np.all(lower_bounds <= rms(positions[i], positions, permutations, align=True) + 1e-9)
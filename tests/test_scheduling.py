@@ -0,0 +1,24 @@
+import os
+
+from conformational_sampling.scheduling import CoreBudget, StageShape, available_cpus
+
+
+def worker_allocation():
+    return os.environ['OMP_NUM_THREADS'], sorted(os.sched_getaffinity(0))
+
+
+def test_core_budget():
+    budget = CoreBudget(8)
+    assert budget.shape(1) == StageShape(processes=8, threads=1)
+    assert budget.shape(3) == StageShape(processes=2, threads=3)
+    assert budget.shape(16) == StageShape(processes=1, threads=8)
+
+    first, second = CoreBudget(8, cpus=range(8)).split(3)
+    assert (first.num_cpus, first.cpus) == (3, [0, 1, 2])
+    assert (second.num_cpus, second.cpus) == (5, [3, 4, 5, 6, 7])
+
+    cpus = available_cpus()
+    with CoreBudget(len(cpus)).executor(len(cpus)) as executor:
+        threads, affinity = executor.submit(worker_allocation).result()
+    assert threads == str(len(cpus))
+    assert affinity == cpus
@@ -0,0 +1,43 @@
+import stk
+from ase.calculators.emt import EMT
+
+from conformational_sampling import screening
+from conformational_sampling.config import Config
+from conformational_sampling.library import LigandLibrary
+from conformational_sampling.main import XTB
+from conformational_sampling.screening import read_manifest, screen
+
+
+def test_screen(tmp_path, monkeypatch):
+    executor_threads = []
+
+    def stage_executor(config, threads_per_task=1, *args, budget=None, **kwargs):
+        executor_threads.append((threads_per_task, budget.num_cpus))
+        return original_stage_executor(config, threads_per_task, *args, budget=budget, **kwargs)
+
+    original_stage_executor = screening.stage_executor
+    monkeypatch.setattr(screening, 'stage_executor', stage_executor)
+
+    for name, smiles in (('dimethylphosphine', 'CPC'), ('ethylmethylphosphine', 'CPCC')):
+        stk.BuildingBlock(smiles).write(str(tmp_path / f'{name}.xyz'))
+    (tmp_path / 'manifest.csv').write_text(
+        'path,smarts\n'
+        'dimethylphosphine.xyz,P\n'
+        'ethylmethylphosphine.xyz,P\n'
+        'missing.xyz,P\n'
+    )
+    entries = read_manifest(tmp_path / 'manifest.csv')
+    assert [entry.name for entry in entries] == ['dimethylphosphine', 'ethylmethylphosphine', 'missing']
+
+    # EMT has no phosphorus parameters, so the DFT stage fails, but it runs on its own executor
+    config = Config(initial_conformers=2, num_cpus=2, dft_cpus_per_opt=2, ase_calculator=EMT(),
+                    library_path=tmp_path / 'library.sqlite')
+    failures = screen(entries, config, tmp_path / 'results', max_concurrent_ligands=2)
+    assert list(failures) == ['missing']
+    # one executor shaped for the stages up to xTB and one for DFT, each with its own core
+    assert executor_threads == [(1, 1), (2, 1)]
+    for entry in entries[:2]:
+        assert (tmp_path / 'results' / entry.name / 'conformers_3_xtb.xyz').exists()
+    with LigandLibrary(tmp_path / 'library.sqlite') as library:
+        assert library.ligands() == ['dimethylphosphine', 'ethylmethylphosphine']
+        assert library.lowest_energy_conformer('dimethylphosphine', XTB) is not None
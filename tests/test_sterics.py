@@ -0,0 +1,16 @@
+import numpy as np
+from conformational_sampling.sterics import ClashDetector, prune_clashes
+
+
+def test_prune_clashes(clashing_complexes):
+    complex, clashing_complex, (ligand_atom_id, methyl_atom_id) = clashing_complexes
+    detector = ClashDetector(complex, vdw_scale=0.5)
+    assert detector.score(complex) == 0
+
+    pairs, overlaps = detector.clashes(clashing_complex.get_position_matrix())
+    assert [ligand_atom_id, methyl_atom_id] in np.sort(pairs, axis=1).tolist()
+    assert np.all(overlaps > 0)
+
+    complexes = [clashing_complex, complex]
+    assert list(prune_clashes(complexes, 0.5, 'reject')) == [complex]
+    assert list(prune_clashes(complexes, 0.5, 'rank')) == [complex, clashing_complex]
@@ -0,0 +1,23 @@
+import numpy as np
+from ase.build import molecule
+from ase.calculators.emt import EMT
+from ase.optimize import BFGS
+
+from conformational_sampling.trajectories import TrajectoryRecorder, load_trajectory
+
+
+def test_trajectory_recorder(tmp_path):
+    atoms = molecule('CH3CH2OH')
+    atoms.calc = EMT()
+    opt = BFGS(atoms, logfile=None)
+    recorder = TrajectoryRecorder(atoms)
+    opt.attach(recorder)
+    opt.run(fmax=0.05, steps=20)
+    recorder.save(tmp_path / 'trajectory.npz')
+
+    trajectory = load_trajectory(tmp_path / 'trajectory.npz')
+    assert trajectory['positions'].shape == (opt.nsteps + 1, len(atoms), 3)
+    assert np.allclose(trajectory['positions'][-1], atoms.get_positions())
+    assert trajectory['energies'][-1] == atoms.get_potential_energy()
+    assert trajectory['fmax'][0] > trajectory['fmax'][-1]
+    assert list(trajectory['numbers']) == list(atoms.numbers)
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+import stk
+from rdkit.Chem.rdmolfiles import MolToMolBlock, MolToXYZBlock
+from openbabel import pybel as pb
+
+from conformational_sampling.main import bind_to_dimethyl_Pd
+from conformational_sampling.utils import (
+    pybel_mol_to_rdkit_mol,
+    pybel_mol_to_stk_mol,
+    stk_mol_to_ase_atoms,
+    stk_mol_to_pybel_mol,
+)
+
+PHOSPHINE = stk.SmartsFunctionalGroupFactory(smarts='P', bonders=(0,), deleters=())
+MOLECULES = {
+    'pd_complex': lambda: bind_to_dimethyl_Pd(stk.BuildingBlock('CPCC', [PHOSPHINE])),
+    'triphenylphosphine': lambda: stk.BuildingBlock('c1ccc(cc1)P(c1ccccc1)c1ccccc1'),
+    'acetate': lambda: stk.BuildingBlock('CC(=O)[O-]'),
+}
+
+
+def atoms_and_bonds(stk_mol):
+    atoms = [(atom.get_atomic_number(), atom.get_charge()) for atom in stk_mol.get_atoms()]
+    bonds = sorted((*sorted((bond.get_atom1().get_id(), bond.get_atom2().get_id())), bond.get_order())
+                   for bond in stk_mol.get_bonds())
+    return atoms, bonds
+
+
+def connectivity(pybel_mol):
+    return sorted(tuple(sorted((bond.GetBeginAtomIdx(), bond.GetEndAtomIdx())))
+                  for bond in pb.ob.OBMolBondIter(pybel_mol.OBMol))
+
+
+@pytest.mark.parametrize('name', MOLECULES)
+def test_stk_pybel_round_trip(name):
+    stk_mol = MOLECULES[name]()
+    round_trip = pybel_mol_to_stk_mol(stk_mol_to_pybel_mol(stk_mol))
+    assert atoms_and_bonds(round_trip) == atoms_and_bonds(stk_mol)
+    assert np.allclose(round_trip.get_position_matrix(), stk_mol.get_position_matrix())
+
+
+@pytest.mark.parametrize('name', MOLECULES)
+def test_converters_match_text_conversion(name):
+    stk_mol = MOLECULES[name]()
+    # the conversions through mol and xyz blocks that the direct converters replace
+    pybel_mol = stk_mol_to_pybel_mol(stk_mol)
+    text_pybel_mol = pb.readstring('mol', MolToMolBlock(stk_mol.to_rdkit_mol()))
+    assert pybel_mol.write('can') == text_pybel_mol.write('can')
+    reperceived = stk_mol_to_pybel_mol(stk_mol, reperceive_bonds=True)
+    text_reperceived = pb.readstring('xyz', MolToXYZBlock(stk_mol.to_rdkit_mol()))
+    assert connectivity(reperceived) == connectivity(text_reperceived)
+
+    # mol blocks only keep 4 decimals of the positions
+    text_stk_mol = stk.BuildingBlock.init_from_rdkit_mol(pybel_mol_to_rdkit_mol(text_pybel_mol))
+    assert atoms_and_bonds(pybel_mol_to_stk_mol(text_pybel_mol)) == atoms_and_bonds(text_stk_mol)
+    assert np.allclose(pybel_mol_to_stk_mol(pybel_mol).get_position_matrix(),
+                       text_stk_mol.get_position_matrix(), atol=1e-4)
+
+
+def test_stk_mol_to_ase_atoms():
+    stk_mol = MOLECULES['acetate']()
+    atoms = stk_mol_to_ase_atoms(stk_mol)
+    assert list(atoms.numbers) == [atom.get_atomic_number() for atom in stk_mol.get_atoms()]
+    assert np.allclose(atoms.positions, stk_mol.get_position_matrix())